@@ -5,6 +5,11 @@ Business Intelligence Agent for Al Balsan Group
 This package contains the main workflow and tools for the business intelligence agent.
 """
 
-from .langgraph_workflow import handle_chat
-
 __all__ = ['handle_chat']
+
+def __getattr__(name):
+    # Import the workflow lazily so importing the package doesn't load LangChain or connect to Postgres
+    if name == 'handle_chat':
+        from .langgraph_workflow import handle_chat
+        return handle_chat
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
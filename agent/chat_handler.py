@@ -1,16 +1,238 @@
 # filepath: /Users/al-husseinabdullah/aqlon/agent/chat_handler.py
-import os
+import asyncio
+import threading
 import uuid
+from collections import OrderedDict, defaultdict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
 from langgraph.checkpoint.postgres import PostgresSaver
+from .config import DATABASE_URL
+
+# Fetch only the messages channel of a thread's latest checkpoint in one round-trip
+SELECT_MESSAGES_SQL = """
+SELECT bl.type, bl.blob
+FROM checkpoints c
+JOIN checkpoint_blobs bl
+    ON bl.thread_id = c.thread_id
+    AND bl.checkpoint_ns = c.checkpoint_ns
+    AND bl.channel = 'messages'
+    AND bl.version = c.checkpoint -> 'channel_versions' ->> 'messages'
+WHERE c.thread_id = %s AND c.checkpoint_ns = ''
+ORDER BY c.checkpoint_id DESC
+LIMIT 1
+"""
+
+# Whether a thread has any stored checkpoint, without loading it
+THREAD_EXISTS_SQL = "SELECT 1 FROM checkpoints WHERE thread_id = %s LIMIT 1"
+
+# Most recently active threads, newest first (checkpoint IDs are time-ordered)
+SELECT_THREADS_SQL = """
+SELECT thread_id, MAX(checkpoint_id) AS last_checkpoint_id
+FROM checkpoints
+WHERE checkpoint_ns = ''
+GROUP BY thread_id
+ORDER BY last_checkpoint_id DESC
+LIMIT %s
+"""
+
+# Maximum number of brand-new sessions tracked to skip their history lookup
+MAX_NEW_THREADS = 10000
+
+# Shared connection pool, created on first use
+_connection_pool: Optional[ConnectionPool] = None
 
 def create_session_id() -> str:
-    """Create a proper UUID session ID."""
-    return str(uuid.uuid4())
-
-def get_postgres_checkpointer():
-    """Create and return a PostgreSQL checkpointer context manager for LangGraph."""
-    connection_string = os.getenv("DATABASE_URL")
-    if not connection_string:
-        raise ValueError("DATABASE_URL environment variable not set")
-    
-    return PostgresSaver.from_conn_string(connection_string)
+    """Create a new session ID (a random UUID as 32 hex characters), the one format used everywhere."""
+    return uuid.uuid4().hex
+
+def get_connection_pool() -> ConnectionPool:
+    """Return the shared PostgreSQL connection pool, creating it on first use."""
+    global _connection_pool
+    if _connection_pool is None:
+        connection_string = DATABASE_URL
+        if not connection_string:
+            raise ValueError("DATABASE_URL environment variable not set")
+
+        # Connection settings required by PostgresSaver
+        _connection_pool = ConnectionPool(
+            connection_string,
+            min_size=2,
+            max_size=10,
+            kwargs={
+                "autocommit": True,
+                "prepare_threshold": 0,
+                "row_factory": dict_row,
+            },
+            open=True,
+        )
+    return _connection_pool
+
+class BufferedPostgresSaver(PostgresSaver):
+    """PostgresSaver that queues checkpoint writes in memory until flush() is called.
+
+    LangGraph checkpoints after every super-step, so a tool-calling turn would
+    otherwise cost several database round-trips. Writes are buffered per thread
+    and sent together, pipelined on a single connection, once the turn ends.
+    """
+
+    def __init__(self, conn: ConnectionPool, serde=None):
+        super().__init__(conn, serde=serde)
+        self._buffer: Dict[str, List[Tuple[str, tuple]]] = defaultdict(list)
+        self._buffer_lock = threading.Lock()
+        self._new_threads: "OrderedDict[str, None]" = OrderedDict()
+
+    def mark_new_thread(self, thread_id: str) -> None:
+        """Record that a thread was just created and has no stored history yet.
+
+        Only call this for session IDs minted within the current request; IDs handed
+        out earlier may already have history written by another worker.
+        """
+        with self._buffer_lock:
+            self._new_threads[thread_id] = None
+            if len(self._new_threads) > MAX_NEW_THREADS:
+                self._new_threads.popitem(last=False)
+
+    def _is_new_thread(self, config: RunnableConfig) -> bool:
+        """Return True if the requested checkpoint belongs to a thread with nothing stored yet."""
+        configurable = config["configurable"]
+        return "checkpoint_id" not in configurable and configurable["thread_id"] in self._new_threads
+
+    def has_thread(self, thread_id: str) -> bool:
+        """Return True if a thread has any stored or queued checkpoint, without deserializing it."""
+        with self._buffer_lock:
+            if thread_id in self._new_threads:
+                return False
+            if self._buffer.get(thread_id):
+                return True
+        with self.conn.connection() as conn:
+            return conn.execute(THREAD_EXISTS_SQL, (thread_id,)).fetchone() is not None
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Fetch a checkpoint tuple, skipping the database for brand-new threads."""
+        if self._is_new_thread(config):
+            return None
+        return super().get_tuple(config)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Queue a checkpoint and return its config without touching the database."""
+        configurable = config["configurable"]
+        with self._buffer_lock:
+            self._buffer[configurable["thread_id"]].append(
+                ("put", (config, checkpoint, metadata, new_versions))
+            )
+        return {
+            "configurable": {
+                "thread_id": configurable["thread_id"],
+                "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: List[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Queue intermediate writes for a checkpoint."""
+        with self._buffer_lock:
+            self._buffer[config["configurable"]["thread_id"]].append(
+                ("put_writes", (config, writes, task_id, task_path))
+            )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Fetch a checkpoint tuple without blocking the event loop."""
+        if self._is_new_thread(config):
+            return None
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """List checkpoints without blocking the event loop."""
+        checkpoints = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Queue a checkpoint; buffering does no I/O so this never blocks."""
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: List[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Queue intermediate writes for a checkpoint."""
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def aflush(self, thread_id: str) -> None:
+        """Persist all queued writes for a thread without blocking the event loop."""
+        await asyncio.to_thread(self.flush, thread_id)
+
+    def get_messages(self, thread_id: str) -> List[BaseMessage]:
+        """Load the message history of a thread without deserializing the other channels."""
+        with self.conn.connection() as conn:
+            row = conn.execute(SELECT_MESSAGES_SQL, (thread_id,)).fetchone()
+
+        if not row or row["type"] == "empty":
+            return []
+        return self.serde.loads_typed((row["type"], row["blob"]))
+
+    def list_threads(self, limit: int = 100) -> List[str]:
+        """Return the IDs of the most recently active threads."""
+        with self.conn.connection() as conn:
+            rows = conn.execute(SELECT_THREADS_SQL, (limit,)).fetchall()
+        return [row["thread_id"] for row in rows]
+
+    def clear_thread(self, thread_id: str) -> None:
+        """Delete everything stored or queued for a thread."""
+        with self._buffer_lock:
+            self._buffer.pop(thread_id, None)
+            self._new_threads.pop(thread_id, None)
+
+        # PostgresSaver knows every table it stores a thread in
+        super().delete_thread(thread_id)
+
+    def flush(self, thread_id: str) -> None:
+        """Persist all queued writes for a thread in one pipelined batch."""
+        with self._buffer_lock:
+            pending = self._buffer.pop(thread_id, [])
+            self._new_threads.pop(thread_id, None)
+        if not pending:
+            return
+
+        with self.conn.connection() as conn, conn.pipeline() as pipe:
+            saver = PostgresSaver(conn, pipe=pipe, serde=self.serde)
+            for method, args in pending:
+                getattr(saver, method)(*args)
+
+def get_postgres_checkpointer() -> BufferedPostgresSaver:
+    """Create and return a PostgreSQL checkpointer for LangGraph backed by the shared pool."""
+    return BufferedPostgresSaver(get_connection_pool())
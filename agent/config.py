@@ -0,0 +1,9 @@
+"""Process-wide configuration, loaded from .env once on first import."""
+
+import os
+from dotenv import load_dotenv
+
+# Real environment variables win over .env, so deployments can override it
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
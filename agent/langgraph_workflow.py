@@ -1,65 +1,22 @@
 # filepath: /Users/al-husseinabdullah/aqlon/agent/langgraph_workflow.py
+import asyncio
+import functools
 import logging
 import os
-from typing import Dict, List, Any, Literal
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
+import re
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Any, Literal, Optional, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langgraph.graph import StateGraph, MessagesState
 from langgraph.prebuilt import create_react_agent
-from langchain.tools import Tool
-from .tools.database import (
-    get_db_schema_and_tables, 
-    get_table_definition, 
-    execute_sql_query,
-    analyze_schema, 
-    analyze_columns,
-    save_summary
-)
-from .tools.fraud_analysis import detect_suspicious_transactions
+from .llm import LLM
+from .tools import ALL_TOOLS
+from .tools.turn_cache import start_turn
 from .chat_handler import get_postgres_checkpointer
-
-# System message
-SYSTEM_PROMPT = """
-You are a multilingual business and financial advisor connected to a PostgreSQL database containing business data about al balsan group in both Arabic and English.
-
-You are assisting the company owner directly hajj abu mohammad. Your mission is to provide not just data, but actionable business insight, financial guidance, and strategic recommendations. You are operating in a prototype phase with sample, incomplete, and unvalidated datasets. Be transparent about prototype limitations.
-
-When analyzing data:
-1. First, get the database schema and tables using get_db_schema_and_tables
-2. For relevant tables, get their definitions using get_table_definition
-3. Use analyze_schema and analyze_columns to identify the best columns for your analysis
-4. Execute SQL queries using execute_sql_query to get the data
-5. Save valuable insights using save_summary
-6. Use detect_suspicious_transactions to analyze a table for potentially suspicious (fraudulent) transactions using multiple rules.
-
-Always:
-- Check for data quality issues (missing values, zeros, etc.)
-- Provide period-specific comparisons when requested
-- Include actionable business advice
-- Add disclaimers for prototype data
-- Respond in the same language as the user's query
-- Maintain context from previous conversations
-- Reference previous insights when relevant
-
-IMPORTANT: When users respond with generic confirmations like "ok", "yes", "proceed", "go ahead", or similar:
-- Look at the previous conversation to see what analysis options you offered
-- Choose the FIRST or MOST RELEVANT option you suggested and execute it automatically
-- If you previously suggested "identifying top customers by sales volume", do that analysis
-- If you suggested multiple options, pick the most commonly requested business insight
-- Don't ask for clarification again - take action based on context
-
-Available tools:
-- get_db_schema_and_tables: Get all schemas and tables
-- get_table_definition: Get column definitions for a specific table
-- analyze_schema: Analyze schema to find relevant tables
-- analyze_columns: Identify best columns for analysis
-- execute_sql_query: Run SQL queries
-- save_summary: Save insights to the database
-- detect_suspicious_transactions: Analyze a table for potentially suspicious (fraudulent) transactions using multiple rules.
-
-Please help the user analyze their data and provide insights.
-"""
+from .prompts import SYSTEM_MESSAGE, CONFIRMATION_INSTRUCTION, system_prompt_tokens
+from .semantic_cache import TRACKED_TABLES, SemanticCache, tables_used_by
 
 # Configure logging
 logging.basicConfig(
@@ -68,56 +25,214 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+# Maximum number of chat messages this worker accepts per minute, across all sessions;
+# unset or 0 disables the limit
+MAX_MESSAGES_PER_MINUTE = int(os.getenv("MAX_MESSAGES_PER_MINUTE") or 0)
+
+# Maximum number of LLM tokens this worker spends per day, across all sessions;
+# unset or 0 disables the budget
+MAX_DAILY_TOKENS = int(os.getenv("MAX_DAILY_TOKENS") or 0)
+
+# Generic confirmations that mean "do what you suggested"
+CONFIRMATIONS = frozenset({
+    "ok", "okay", "yes", "yep", "sure", "proceed", "go ahead", "continue", "do it",
+    "نعم", "تمام", "موافق", "اوكي", "حسنا", "استمر", "يلا"
+})
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+def _expand_confirmation(message: BaseMessage) -> BaseMessage:
+    """Show the model a bare user confirmation as an explicit instruction to run the suggested analysis."""
+    if isinstance(message, HumanMessage) and isinstance(message.content, str):
+        normalized = " ".join(_PUNCTUATION.sub("", message.content).lower().split())
+        if normalized in CONFIRMATIONS:
+            return HumanMessage(content=CONFIRMATION_INSTRUCTION, id=message.id)
+    return message
+
+# Number of messages the history window is reset to once it has grown to twice this size
+MAX_HISTORY_LENGTH = 20
+
+def _truncate_history(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """Return the history window sent to the LLM.
+
+    The window grows append-only from MAX_HISTORY_LENGTH to 2 * MAX_HISTORY_LENGTH
+    messages before jumping forward, so consecutive requests share the same prefix
+    and keep hitting OpenAI's prompt cache. The start is the last user message at
+    or before that cut, so tool calls are never separated from their results and
+    a turn with a long tool loop is never cut off from its own question.
+    """
+    end = len(messages)
+    if end < 2 * MAX_HISTORY_LENGTH:
+        return messages
+
+    cut = (end // MAX_HISTORY_LENGTH - 1) * MAX_HISTORY_LENGTH
+    for window_start in range(cut, -1, -1):
+        if isinstance(messages[window_start], HumanMessage):
+            return messages[window_start:end]
+    return messages
+
+def _history_window_hook(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Pre-model hook that shapes the LLM input without touching stored history.
+
+    Limits the window and expands confirmations; the stored conversation keeps
+    what the user actually typed.
+    """
+    return {"llm_input_messages": [_expand_confirmation(m) for m in _truncate_history(state["messages"])]}
 
 class BusinessAdvisorWorkflow:
     def __init__(self):
         """Initialize the LangGraph workflow with PostgreSQL checkpointing."""
         
         # Initialize LLM
-        self.llm = ChatOpenAI(
-            model="gpt-4-1106-preview",
-            temperature=0,
-            max_tokens=4000  
-        )
+        self.llm = LLM
         
         # Initialize tools
-        self.tools = [
-            get_db_schema_and_tables,
-            get_table_definition,
-            execute_sql_query,
-            analyze_schema,
-            analyze_columns,
-            save_summary,
-            Tool(
-                name="detect_suspicious_transactions",
-                func=lambda table, amount_threshold=100000.0: detect_suspicious_transactions(
-                    execute_sql_query, table, amount_threshold
-                ),
-                description="Analyze a table for potentially suspicious (fraudulent) transactions using multiple rules. Parameters: table (str), amount_threshold (float, optional)."
-            )
-        ]
+        self.tools = ALL_TOOLS
+        
+        # Timestamps (time.monotonic_ns) of messages accepted in the last minute
+        self.message_timestamps: Deque[int] = deque(maxlen=MAX_MESSAGES_PER_MINUTE)
+        
+        # Daily token usage, reset every 24 hours
+        self.daily_token_count = 0
+        self.last_reset = time.monotonic_ns()
+        
+        # Guards the rate-limit counters, which are shared by concurrent requests
+        self._usage_lock = threading.Lock()
         
         # Initialize PostgreSQL checkpointer first
         try:
-            self.checkpointer_ctx = get_postgres_checkpointer()
-            self.checkpointer = self.checkpointer_ctx.__enter__()
+            self.checkpointer = get_postgres_checkpointer()
             logger.info("PostgreSQL checkpointer initialized successfully")
         except Exception as e:
-            logger.error(f"Failed to initialize PostgreSQL checkpointer: {e}")
+            logger.error("Failed to initialize PostgreSQL checkpointer: %s", e)
             self.checkpointer = None
-            self.checkpointer_ctx = None
         
-        # Create the agent with LangGraph's create_react_agent
+        # Create the agent with LangGraph's create_react_agent; it is compiled once
+        # here and shared by every session, with per-call state passed via config
         self.agent = create_react_agent(
             model=self.llm,
             tools=self.tools,
-            prompt=SYSTEM_PROMPT,
-            checkpointer=self.checkpointer
+            prompt=SYSTEM_MESSAGE,
+            pre_model_hook=_history_window_hook,
+            checkpointer=self.checkpointer,
+            debug=os.getenv("AGENT_VERBOSE") == "1"
         )
+        
+        # Initialize semantic response cache. Cached answers are only evicted when a tracked
+        # table changes, so the cache stays off until tracked tables are configured
+        self.cache = None
+        cache_enabled = self.checkpointer and os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+        if cache_enabled and not TRACKED_TABLES:
+            logger.warning("Semantic response cache disabled: SEMANTIC_CACHE_TRACKED_TABLES is not set")
+        elif cache_enabled:
+            try:
+                self.cache = SemanticCache()
+                logger.info("Semantic response cache initialized successfully")
+            except Exception as e:
+                logger.warning("Semantic response cache disabled: %s", e)
+    
+    def _check_cache(self, message: str, config: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        """Look up a cached answer for the first message of a session.
+        
+        Returns the cached answer (if any) and the message embedding, so a miss can
+        be stored without embedding the message again. Follow-up messages depend on
+        the conversation so far and are never cached.
+        """
+        if not self.cache or self.checkpointer.has_thread(config["configurable"]["thread_id"]):
+            return None, None
+        
+        try:
+            answer = self.cache.lookup_exact(message)
+            if answer is not None:
+                return answer, None
+            embedding = self.cache.embed(message)
+            return self.cache.lookup(embedding), embedding
+        except Exception as e:
+            logger.warning("Semantic cache lookup failed: %s", e)
+            return None, None
     
-    async def handle_chat(self, message: str, session_id: str) -> Dict[str, Any]:
+    def _store_in_cache(self, embedding: Optional[str], message: str, response: str, turn_messages: List[BaseMessage]) -> None:
+        """Store an agent response for a standalone question in the semantic cache."""
+        if embedding is None:
+            return
+        
+        try:
+            self.cache.store(embedding, message, response, tables_used_by(turn_messages))
+        except Exception as e:
+            logger.warning("Semantic cache store failed: %s", e)
+    
+    def _record_cached_turn(self, message: str, response: str, config: Dict[str, Any]) -> None:
+        """Append a turn answered from the cache to the session history."""
+        self.agent.update_state(
+            config,
+            {"messages": [HumanMessage(content=message), AIMessage(content=response)]},
+            as_node="agent"
+        )
+        self.checkpointer.flush(config["configurable"]["thread_id"])
+    
+    async def _arecord_cached_turn(self, message: str, response: str, config: Dict[str, Any]) -> None:
+        """Async version of _record_cached_turn."""
+        await self.agent.aupdate_state(
+            config,
+            {"messages": [HumanMessage(content=message), AIMessage(content=response)]},
+            as_node="agent"
+        )
+        await self.checkpointer.aflush(config["configurable"]["thread_id"])
+    
+    def _check_rate_limits(self, message: str) -> Optional[str]:
+        """Record an incoming message and return an error if a rate limit is exceeded."""
+        now = time.monotonic_ns()
+        with self._usage_lock:
+            if now - self.last_reset >= 86_400_000_000_000:
+                self.daily_token_count = 0
+                self.last_reset = now
+            
+            # Approximate the request's minimum cost (~4 characters per token) without tokenizing it
+            if MAX_DAILY_TOKENS and self.daily_token_count + system_prompt_tokens() + len(message) // 4 > MAX_DAILY_TOKENS:
+                return "Daily token limit reached. Please try again tomorrow."
+            
+            if MAX_MESSAGES_PER_MINUTE:
+                while self.message_timestamps and now - self.message_timestamps[0] >= 60_000_000_000:
+                    self.message_timestamps.popleft()
+                
+                if len(self.message_timestamps) >= MAX_MESSAGES_PER_MINUTE:
+                    return "Rate limit exceeded. Please wait a moment before sending another message."
+                
+                self.message_timestamps.append(now)
+        return None
+    
+    def _record_token_usage(self, tokens_used: int) -> None:
+        """Add the tokens spent on a turn to the daily count in a single update."""
+        with self._usage_lock:
+            self.daily_token_count += tokens_used
+    
+    @staticmethod
+    def _latest_turn(result: Optional[Dict[str, Any]]) -> List[BaseMessage]:
+        """Return the messages the agent produced after the latest user message."""
+        messages = (result or {}).get("messages", [])
+        for i in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[i], HumanMessage):
+                return messages[i + 1:]
+        return messages
+    
+    @staticmethod
+    def _count_tokens(turn_messages: List[BaseMessage]) -> int:
+        """Sum the token usage OpenAI reported for the AI messages of a turn."""
+        tokens_used = 0
+        for msg in turn_messages:
+            usage = getattr(msg, "usage_metadata", None)
+            if usage:
+                tokens_used += usage.get("total_tokens", 0)
+        return tokens_used
+    
+    @staticmethod
+    def _extract_response(result: Optional[Dict[str, Any]]) -> str:
+        """Extract the last message (the agent's response) from an agent result."""
+        if result and "messages" in result and result["messages"]:
+            last_message = result["messages"][-1]
+            return last_message.content if hasattr(last_message, 'content') else str(last_message)
+        return "No response generated"
+    
+    async def handle_chat(self, message: str, session_id: str, new_session: bool = False) -> Dict[str, Any]:
         """Handle chat message using LangGraph workflow."""
         try:
             if not self.checkpointer:
@@ -126,37 +241,136 @@ class BusinessAdvisorWorkflow:
                     "error": "PostgreSQL checkpointer not available"
                 }
             
+            rate_limit_error = self._check_rate_limits(message)
+            if rate_limit_error:
+                return {
+                    "response": None,
+                    "error": rate_limit_error,
+                    "session_id": session_id
+                }
+            
             # Create config with session ID for checkpointing
             config = {"configurable": {"thread_id": session_id}}
             
-            # Invoke the agent with the message
-            result = await self.agent.ainvoke(
-                {"messages": [HumanMessage(content=message)]},
-                config=config
-            )
+            # A session minted for this request has no stored history to load
+            if new_session:
+                self.checkpointer.mark_new_thread(session_id)
+            
+            # Answer repeated standalone questions from the semantic cache
+            cached_response, embedding = await asyncio.to_thread(self._check_cache, message, config)
+            if cached_response is not None:
+                await self._arecord_cached_turn(message, cached_response, config)
+                return {
+                    "response": cached_response,
+                    "error": None,
+                    "session_id": session_id
+                }
             
-            # Extract the last message (the agent's response)
-            if result and "messages" in result and result["messages"]:
-                last_message = result["messages"][-1]
-                response_content = last_message.content if hasattr(last_message, 'content') else str(last_message)
-            else:
-                response_content = "No response generated"
+            # Repeated identical tool calls within this turn reuse the first result
+            start_turn()
+            
+            # Invoke the agent with the message; checkpoints are written once it returns
+            try:
+                result = await self.agent.ainvoke(
+                    {"messages": [HumanMessage(content=message)]},
+                    config=config
+                )
+            finally:
+                await self.checkpointer.aflush(session_id)
+            
+            response_content = self._extract_response(result)
+            turn_messages = self._latest_turn(result)
+            tokens_used = self._count_tokens(turn_messages)
+            self._record_token_usage(tokens_used)
+            await asyncio.to_thread(self._store_in_cache, embedding, message, response_content, turn_messages)
             
             return {
                 "response": response_content,
                 "error": None,
-                "session_id": session_id
+                "session_id": session_id,
+                "tokens_used": tokens_used
             }
             
         except Exception as e:
-            logger.error(f"Error in handle_chat: {str(e)}", exc_info=True)
+            logger.error("Error in handle_chat: %s", e, exc_info=True)
             return {
                 "response": None,
                 "error": f"Error processing message: {str(e)}",
                 "session_id": session_id
             }
     
-    def handle_chat_sync(self, message: str, session_id: str) -> Dict[str, Any]:
+    async def stream_chat(self, message: str, session_id: str, new_session: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the agent's answer token by token as it is generated.
+        
+        Yields {"type": "content", "content": ...} events as the agent writes, followed
+        by a single {"type": "done"} event carrying the final answer as "response", or
+        an {"type": "error"} event.
+        """
+        try:
+            if not self.checkpointer:
+                yield {"type": "error", "error": "PostgreSQL checkpointer not available"}
+                return
+            
+            rate_limit_error = self._check_rate_limits(message)
+            if rate_limit_error:
+                yield {"type": "error", "error": rate_limit_error}
+                return
+            
+            # Create config with session ID for checkpointing
+            config = {"configurable": {"thread_id": session_id}}
+            
+            # A session minted for this request has no stored history to load
+            if new_session:
+                self.checkpointer.mark_new_thread(session_id)
+            
+            # Answer repeated standalone questions from the semantic cache
+            cached_response, embedding = await asyncio.to_thread(self._check_cache, message, config)
+            if cached_response is not None:
+                await self._arecord_cached_turn(message, cached_response, config)
+                yield {"type": "content", "content": cached_response}
+                yield {"type": "done", "tokens_used": 0, "response": cached_response}
+                return
+            
+            # Repeated identical tool calls within this turn reuse the first result
+            start_turn()
+            
+            # Stream tokens from the agent node only; tool-internal LLM calls are not part of the answer
+            response_content = "No response generated"
+            turn_messages: List[BaseMessage] = []
+            tokens_used = 0
+            try:
+                async for event in self.agent.astream_events(
+                    {"messages": [HumanMessage(content=message)]},
+                    config=config,
+                    version="v2"
+                ):
+                    if event["metadata"].get("langgraph_node") != "agent":
+                        continue
+                    
+                    if event["event"] == "on_chat_model_stream":
+                        chunk = event["data"]["chunk"]
+                        if chunk.content and not chunk.tool_call_chunks:
+                            yield {"type": "content", "content": chunk.content}
+                    elif event["event"] == "on_chat_model_end":
+                        output = event["data"]["output"]
+                        turn_messages.append(output)
+                        response_content = output.content
+                        usage = getattr(output, "usage_metadata", None)
+                        if usage:
+                            tokens_used += usage.get("total_tokens", 0)
+            finally:
+                await self.checkpointer.aflush(session_id)
+            
+            self._record_token_usage(tokens_used)
+            await asyncio.to_thread(self._store_in_cache, embedding, message, response_content, turn_messages)
+            
+            yield {"type": "done", "tokens_used": tokens_used, "response": response_content}
+            
+        except Exception as e:
+            logger.error("Error in stream_chat: %s", e, exc_info=True)
+            yield {"type": "error", "error": f"Error processing message: {str(e)}"}
+    
+    def handle_chat_sync(self, message: str, session_id: str, new_session: bool = False) -> Dict[str, Any]:
         """Synchronous version of handle_chat for compatibility."""
         try:
             if not self.checkpointer:
@@ -165,73 +379,128 @@ class BusinessAdvisorWorkflow:
                     "error": "PostgreSQL checkpointer not available"
                 }
             
+            rate_limit_error = self._check_rate_limits(message)
+            if rate_limit_error:
+                return {
+                    "response": None,
+                    "error": rate_limit_error,
+                    "session_id": session_id
+                }
+            
             # Create config with session ID for checkpointing
             config = {"configurable": {"thread_id": session_id}}
             
-            # Invoke the agent with the message
-            result = self.agent.invoke(
-                {"messages": [HumanMessage(content=message)]},
-                config=config
-            )
+            # A session minted for this request has no stored history to load
+            if new_session:
+                self.checkpointer.mark_new_thread(session_id)
+            
+            # Answer repeated standalone questions from the semantic cache
+            cached_response, embedding = self._check_cache(message, config)
+            if cached_response is not None:
+                self._record_cached_turn(message, cached_response, config)
+                return {
+                    "response": cached_response,
+                    "error": None,
+                    "session_id": session_id
+                }
+            
+            # Repeated identical tool calls within this turn reuse the first result
+            start_turn()
+            
+            # Invoke the agent with the message; checkpoints are written once it returns
+            try:
+                result = self.agent.invoke(
+                    {"messages": [HumanMessage(content=message)]},
+                    config=config
+                )
+            finally:
+                self.checkpointer.flush(session_id)
             
-            # Extract the last message (the agent's response)
-            if result and "messages" in result and result["messages"]:
-                last_message = result["messages"][-1]
-                response_content = last_message.content if hasattr(last_message, 'content') else str(last_message)
-            else:
-                response_content = "No response generated"
+            response_content = self._extract_response(result)
+            turn_messages = self._latest_turn(result)
+            tokens_used = self._count_tokens(turn_messages)
+            self._record_token_usage(tokens_used)
+            self._store_in_cache(embedding, message, response_content, turn_messages)
             
             return {
                 "response": response_content,
                 "error": None,
-                "session_id": session_id
+                "session_id": session_id,
+                "tokens_used": tokens_used
             }
             
         except Exception as e:
-            logger.error(f"Error in handle_chat_sync: {str(e)}", exc_info=True)
+            logger.error("Error in handle_chat_sync: %s", e, exc_info=True)
             return {
                 "response": None,
                 "error": f"Error processing message: {str(e)}",
                 "session_id": session_id
             }
 
-# Create global instance
-workflow = BusinessAdvisorWorkflow()
+@functools.cache
+def get_workflow() -> BusinessAdvisorWorkflow:
+    """Return the global workflow instance, creating it on first use."""
+    return BusinessAdvisorWorkflow()
 
-# Export the graph for LangGraph Studio
-graph = workflow.agent
+def __getattr__(name: str) -> Any:
+    # Expose the global instance and the graph for LangGraph Studio without building them at import
+    if name == "workflow":
+        return get_workflow()
+    if name == "graph":
+        return get_workflow().agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-def handle_chat(message: str, session_id: str) -> Dict[str, Any]:
+def handle_chat(message: str, session_id: str, new_session: bool = False) -> Dict[str, Any]:
     """Wrapper function to handle chat messages."""
-    return workflow.handle_chat_sync(message, session_id)
+    return get_workflow().handle_chat_sync(message, session_id, new_session)
+
+async def ahandle_chat(message: str, session_id: str, new_session: bool = False) -> Dict[str, Any]:
+    """Async wrapper function to handle chat messages without blocking the event loop."""
+    return await get_workflow().handle_chat(message, session_id, new_session)
+
+def stream_chat(message: str, session_id: str, new_session: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    """Wrapper function to stream chat responses as they are generated."""
+    return get_workflow().stream_chat(message, session_id, new_session)
 
 def get_chat_history(session_id: str) -> List[Dict[str, str]]:
     """Get chat history using LangGraph's checkpointer."""
     try:
+        workflow = get_workflow()
         if not workflow.checkpointer:
             return []
         
-        # Get the checkpoint for this session
-        config = {"configurable": {"thread_id": session_id}}
-        checkpoint = workflow.checkpointer.get(config)
-        
-        if not checkpoint or "messages" not in checkpoint:
-            return []
+        # Load the messages of the latest checkpoint for this session
+        messages = workflow.checkpointer.get_messages(session_id)
         
-        # Convert messages to the expected format
-        history = []
-        for msg in checkpoint["messages"]:
-            if hasattr(msg, 'type'):
-                role = "user" if msg.type == "human" else "assistant"
-                content = msg.content if hasattr(msg, 'content') else str(msg)
-                history.append({
-                    "role": role,
-                    "content": content,
-                    "timestamp": ""
-                })
-        
-        return history
+        # Convert the conversation to the expected format; tool results and the
+        # empty AI messages that only carry tool calls are not part of it
+        return [
+            {
+                "role": "user" if isinstance(msg, HumanMessage) else "assistant",
+                "content": msg.content,
+                "timestamp": ""
+            }
+            for msg in messages
+            if isinstance(msg, (HumanMessage, AIMessage)) and msg.content
+        ]
         
     except Exception as e:
-        logger.error(f"Error getting chat history: {str(e)}", exc_info=True)
+        logger.error("Error getting chat history: %s", e, exc_info=True)
+        return []
+
+def list_chat_sessions(limit: int = 100) -> List[str]:
+    """List the most recently active session IDs stored by the checkpointer."""
+    try:
+        workflow = get_workflow()
+        if not workflow.checkpointer:
+            return []
+        return workflow.checkpointer.list_threads(limit)
+    except Exception as e:
+        logger.error("Error listing chat sessions: %s", e, exc_info=True)
         return []
+
+def clear_chat_history(session_id: str) -> None:
+    """Delete the stored conversation of a session."""
+    workflow = get_workflow()
+    if workflow.checkpointer:
+        workflow.checkpointer.clear_thread(session_id)
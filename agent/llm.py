@@ -0,0 +1,21 @@
+"""Chat model shared by the agent and its tools."""
+
+from langchain_core.caches import InMemoryCache
+from langchain_openai import ChatOpenAI
+from . import config  # noqa: F401  (loads OPENAI_API_KEY from .env)
+
+# One client for the whole process so every caller reuses the same HTTP connection pool;
+# stream_usage makes streamed responses report token usage in their final chunk
+LLM = ChatOpenAI(
+    model="gpt-4-1106-preview",
+    temperature=0,
+    max_tokens=4000,
+    stream_usage=True
+)
+
+# Same client with an in-process response cache for the deterministic analysis tools,
+# so a repeated prompt returns the earlier completion without another request
+ANALYSIS_LLM = LLM.model_copy(update={"cache": InMemoryCache(maxsize=1024)})
+
+# Analysis client constrained to reply with a single JSON object, for tools that parse the reply
+ANALYSIS_JSON_LLM = ANALYSIS_LLM.bind(response_format={"type": "json_object"})
@@ -0,0 +1,215 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+import psycopg
+from psycopg import sql
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_openai import OpenAIEmbeddings
+from .chat_handler import get_connection_pool
+from .config import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+# Cosine distance under which a cached answer is considered a match; questions that differ
+# only in a date or a name can fall under a loose threshold, so keep it tight
+SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_MAX_DISTANCE", "0.05"))
+
+# Cached answers older than this are ignored
+CACHE_TTL_HOURS = int(os.getenv("SEMANTIC_CACHE_TTL_HOURS", "24"))
+
+# Business tables whose changes invalidate cached answers (comma-separated, optionally schema-qualified)
+TRACKED_TABLES = [t.strip() for t in os.getenv("SEMANTIC_CACHE_TRACKED_TABLES", "").split(",") if t.strip()]
+
+# Number of answers kept in memory for exact repeats of a question
+EXACT_CACHE_SIZE = 1024
+
+# Channel the invalidation triggers notify on
+INVALIDATION_CHANNEL = "llm_cache_invalidate"
+
+# Table references in generated SQL
+_TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN)\s+((?:"?\w+"?\.)?"?\w+"?)', re.IGNORECASE)
+
+def _table_name(reference: str) -> str:
+    """Normalize a possibly schema-qualified, quoted table reference to its bare name."""
+    return reference.split(".")[-1].strip('"').lower()
+
+def _normalize(message: str) -> str:
+    """Normalize a question for exact-match lookups (case and whitespace insensitive)."""
+    return " ".join(message.lower().split())
+
+def tables_used_by(messages: Iterable[BaseMessage]) -> List[str]:
+    """Return the names of the tables queried by the tool calls in a turn."""
+    tables = set()
+    for msg in messages:
+        if not isinstance(msg, AIMessage):
+            continue
+        for tool_call in msg.tool_calls:
+            if tool_call["name"] == "execute_sql_query":
+                query = tool_call["args"].get("query", "")
+                tables.update(_table_name(ref) for ref in _TABLE_REFERENCE.findall(query))
+            elif tool_call["name"] == "detect_suspicious_transactions":
+                tables.update(_table_name(arg) for arg in tool_call["args"].values() if isinstance(arg, str))
+    return sorted(tables)
+
+class SemanticCache:
+    """Semantic LLM response cache stored in a pgvector table.
+
+    Cached answers record the tables they were computed from. Triggers on the
+    tracked business tables delete the affected answers as soon as the data
+    changes and NOTIFY each worker's listener thread to evict them from memory;
+    the TTL remains as a safety net.
+    Exact repeats of a question are answered from an in-memory LRU in front of
+    the table, without embedding the question first.
+    """
+
+    def __init__(self):
+        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+        self.pool = get_connection_pool()
+        # normalized question -> (answer, tables used, time.monotonic() when stored)
+        self._exact: "OrderedDict[str, Tuple[str, List[str], float]]" = OrderedDict()
+        self._exact_lock = threading.Lock()
+        self._setup()
+        self._listener = threading.Thread(target=self._listen, name="llm-cache-invalidator", daemon=True)
+        self._listener.start()
+
+    def _setup(self) -> None:
+        """Create the cache table and triggers once, serialized across workers starting together."""
+        with self.pool.connection() as conn, conn.transaction():
+            conn.execute("SELECT pg_advisory_xact_lock(hashtext('llm_cache_setup'))")
+            self._create_table(conn)
+            self._install_triggers(conn)
+
+    def _create_table(self, conn: psycopg.Connection) -> None:
+        """Create the cache table and its indexes if they don't exist."""
+        conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            id SERIAL PRIMARY KEY,
+            embedding vector(1536),
+            question TEXT,
+            answer TEXT,
+            tables_used TEXT[] DEFAULT '{}',
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        conn.execute("ALTER TABLE llm_cache ADD COLUMN IF NOT EXISTS tables_used TEXT[] DEFAULT '{}'")
+        # HNSW needs no training data, unlike the ivfflat index it replaces, which was built on an empty table
+        conn.execute("DROP INDEX IF EXISTS llm_cache_embedding_idx")
+        conn.execute("""
+        CREATE INDEX IF NOT EXISTS llm_cache_embedding_hnsw_idx
+        ON llm_cache USING hnsw (embedding vector_cosine_ops)
+        """)
+        conn.execute("""
+        CREATE INDEX IF NOT EXISTS llm_cache_tables_used_idx
+        ON llm_cache USING gin (tables_used)
+        """)
+
+    def _install_triggers(self, conn: psycopg.Connection) -> None:
+        """Install statement-level invalidation triggers on tracked tables that don't have one yet.
+
+        The trigger deletes the stale cached answers in the writing transaction, so the
+        rows are removed exactly once, and notifies every worker to drop its in-memory tier.
+        """
+        if not TRACKED_TABLES:
+            return
+
+        conn.execute(f"""
+        CREATE OR REPLACE FUNCTION llm_cache_notify() RETURNS trigger
+        LANGUAGE plpgsql SECURITY DEFINER SET search_path FROM CURRENT AS $$
+        BEGIN
+            DELETE FROM llm_cache WHERE tables_used && ARRAY[lower(TG_TABLE_NAME)]::TEXT[];
+            PERFORM pg_notify('{INVALIDATION_CHANNEL}', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$
+        """)
+        for table in TRACKED_TABLES:
+            table_id = sql.Identifier(*table.split("."))
+            # Creating a trigger locks the business table, so only do it when it is missing
+            exists = conn.execute(
+                "SELECT 1 FROM pg_trigger WHERE tgrelid = to_regclass(%s) AND tgname = 'llm_cache_invalidate'",
+                (table_id.as_string(conn),)
+            ).fetchone()
+            if exists:
+                continue
+            conn.execute(sql.SQL("""
+            CREATE TRIGGER llm_cache_invalidate
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {}
+            FOR EACH STATEMENT EXECUTE FUNCTION llm_cache_notify()
+            """).format(table_id))
+
+    def _listen(self) -> None:
+        """Drop in-memory answers whenever a tracked table notifies a change."""
+        while True:
+            try:
+                with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+                    for notify in conn.notifies():
+                        self.invalidate(notify.payload)
+            except Exception as e:
+                logger.warning("Semantic cache listener disconnected, retrying: %s", e)
+                time.sleep(5)
+
+    def invalidate(self, table: str) -> None:
+        """Forget in-memory answers computed from the given table.
+
+        The stored rows are deleted by the table's trigger, so no worker repeats that here.
+        """
+        table = table.lower()
+        with self._exact_lock:
+            stale = [key for key, (_, tables, _) in self._exact.items() if table in tables]
+            for key in stale:
+                del self._exact[key]
+
+    def lookup_exact(self, message: str) -> Optional[str]:
+        """Return the in-memory answer to the exact same question, if still fresh."""
+        key = _normalize(message)
+        with self._exact_lock:
+            entry = self._exact.get(key)
+            if entry is None:
+                return None
+            answer, _, stored_at = entry
+            if time.monotonic() - stored_at > CACHE_TTL_HOURS * 3600:
+                del self._exact[key]
+                return None
+            self._exact.move_to_end(key)
+            return answer
+
+    def embed(self, message: str) -> str:
+        """Embed a message and return it as a pgvector literal."""
+        vector: List[float] = self.embeddings.embed_query(message)
+        return "[" + ",".join(map(str, vector)) + "]"
+
+    def lookup(self, embedding: str) -> Optional[str]:
+        """Return the cached answer for the nearest question, if it is close enough."""
+        with self.pool.connection() as conn:
+            row = conn.execute("""
+            SELECT answer, embedding <=> %s::vector AS distance
+            FROM llm_cache
+            WHERE created_at >= NOW() - make_interval(hours => %s)
+            ORDER BY embedding <=> %s::vector
+            LIMIT 1
+            """, (embedding, CACHE_TTL_HOURS, embedding)).fetchone()
+
+        if row and row["distance"] < SIMILARITY_THRESHOLD:
+            return row["answer"]
+        return None
+
+    def store(self, embedding: str, question: str, answer: str, tables_used: List[str]) -> None:
+        """Store a question/answer pair in the cache along with the tables it depends on."""
+        key = _normalize(question)
+        with self._exact_lock:
+            self._exact[key] = (answer, tables_used, time.monotonic())
+            self._exact.move_to_end(key)
+            if len(self._exact) > EXACT_CACHE_SIZE:
+                self._exact.popitem(last=False)
+
+        with self.pool.connection() as conn:
+            conn.execute("""
+            INSERT INTO llm_cache (embedding, question, answer, tables_used)
+            VALUES (%s::vector, %s, %s, %s)
+            """, (embedding, question, answer, tables_used))
@@ -1,20 +1,70 @@
 """Tools package for database, LLM, and summary operations."""
 
+from langchain_core.tools import StructuredTool
+
 # Import all database tools from the database subpackage
 from .database import (
     get_db_schema_and_tables,
     get_table_definition, 
+    get_table_definitions,
+    get_full_catalog,
+    refresh_schema_cache,
+    execute_sql_query,
+    analyze_schema,
+    analyze_columns,
+    analyze_columns_bulk,
+    save_summary,
+    save_summaries,
+    list_tables
+)
+from .fraud_analysis import aggregate_view_name, detect_suspicious_transactions
+
+def _detect_suspicious_transactions(table: str, amount_threshold: float = 100000.0) -> str:
+    """Run the fraud probes against a catalog table, using its prebuilt aggregates when present."""
+    tables = list_tables()
+    return detect_suspicious_transactions(
+        execute_sql_query.func,
+        table,
+        amount_threshold=amount_threshold,
+        allowed_tables=tables,
+        use_aggregates=aggregate_view_name(table.strip()) in tables
+    )
+
+# Built once at import so the tool objects, and the schemas sent to the LLM, are identical on every request
+DETECT_SUSPICIOUS_TX_TOOL = StructuredTool.from_function(
+    func=_detect_suspicious_transactions,
+    name="detect_suspicious_transactions",
+    description="Analyze a table for potentially suspicious (fraudulent) transactions using multiple rules. Parameters: table (str), amount_threshold (float, optional)."
+)
+
+# Fixed tool order keeps the serialized tool schemas byte-stable for OpenAI's prompt cache
+ALL_TOOLS = (
+    get_full_catalog,
+    get_db_schema_and_tables,
+    get_table_definition,
+    get_table_definitions,
+    refresh_schema_cache,
     execute_sql_query,
     analyze_schema,
     analyze_columns,
-    save_summary
+    analyze_columns_bulk,
+    save_summary,
+    save_summaries,
+    DETECT_SUSPICIOUS_TX_TOOL,
 )
 
 __all__ = [
     'get_db_schema_and_tables',
     'get_table_definition', 
+    'get_table_definitions',
+    'get_full_catalog',
+    'refresh_schema_cache',
     'execute_sql_query',
     'analyze_schema',
     'analyze_columns',
-    'save_summary'
-] 
\ No newline at end of file
+    'analyze_columns_bulk',
+    'save_summary',
+    'save_summaries',
+    'DETECT_SUSPICIOUS_TX_TOOL',
+    'ALL_TOOLS'
+]
@@ -1,14 +1,22 @@
 # Database tools package
 # This package contains all database-related tools for the Al Balsan agent
 
-from .db_tools import get_db_schema_and_tables, get_table_definition, execute_sql_query, analyze_schema, analyze_columns
-from .summary_tools import save_summary
+from .db_tools import get_db_schema_and_tables, get_table_definition, get_table_definitions, get_full_catalog, refresh_schema_cache, execute_sql_query, analyze_schema, analyze_columns, analyze_columns_bulk, list_tables, invalidate_schema_cache, invalidate_query_cache
+from .summary_tools import save_summary, save_summaries
 
 __all__ = [
     'get_db_schema_and_tables',
     'get_table_definition', 
+    'get_table_definitions',
+    'get_full_catalog',
+    'refresh_schema_cache',
     'execute_sql_query',
     'analyze_schema',
     'analyze_columns',
-    'save_summary'
+    'analyze_columns_bulk',
+    'save_summary',
+    'save_summaries',
+    'list_tables',
+    'invalidate_schema_cache',
+    'invalidate_query_cache'
 ]
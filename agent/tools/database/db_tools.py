@@ -1,153 +1,624 @@
-from typing import Dict, List, Any
+import asyncio
+from collections import defaultdict
+from concurrent.futures import Future
+from typing import Dict, List, Any, Optional, Set, Tuple, Union
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
 from langchain.tools import tool
-from langchain_openai import ChatOpenAI
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
+from langchain_core.tools import StructuredTool
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+import logging
 import os
+import functools
 import json
+import re
+import orjson
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+import threading
+from ...llm import ANALYSIS_JSON_LLM, ANALYSIS_LLM
+from ...prompts import COLUMNS_BULK_PROMPT, COLUMNS_PROMPT, SCHEMA_PROMPT
+from ..turn_cache import memoize_per_turn
+from .engine import STATEMENT_TIMEOUT_MS, async_engine, engine
 
-# Load environment variables
-load_dotenv(override=True)
+logger = logging.getLogger(__name__)
 
-# Debug: Print environment variables
-print("Environment variables loaded:")
-print(f"DATABASE_URL: {os.getenv('DATABASE_URL')}")
+# Catalog queries, built once and executed with bound parameters
+SCHEMA_TABLES_QUERY = text("""
+SELECT table_schema, table_name
+FROM information_schema.tables
+WHERE table_schema NOT IN ('information_schema', 'pg_catalog')
+UNION ALL
+SELECT schemaname, matviewname
+FROM pg_matviews
+ORDER BY 1, 2
+""")
 
-# Initialize database connection
-db_url = os.getenv("DATABASE_URL")
-if not db_url:
-    raise ValueError("DATABASE_URL environment variable is not set")
+# Column definitions are read from pg_attribute rather than the much slower
+# information_schema.columns view, and aggregated to one JSON array per table server-side
+_COLUMNS_JSON = """
+COALESCE(jsonb_agg(jsonb_build_object(
+    'name', a.attname,
+    'type', format_type(a.atttypid, a.atttypmod),
+    'nullable', CASE WHEN a.attnotnull THEN 'NO' ELSE 'YES' END,
+    'default', pg_get_expr(d.adbin, d.adrelid)
+) ORDER BY a.attnum), CAST('[]' AS JSONB))"""
 
-engine = create_engine(db_url)
+_COLUMNS_JOIN = """
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum"""
 
-# Initialize LLM for analysis tools
-llm = ChatOpenAI(model="gpt-4-1106-preview", temperature=0, openai_api_key=os.getenv("OPENAI_API_KEY"))
+TABLE_DEFINITION_QUERY = text(f"""
+SELECT {_COLUMNS_JSON}
+FROM pg_class c
+{_COLUMNS_JOIN}
+WHERE n.nspname = :schema_name
+AND c.relname = :table
+""")
+
+# Columns of a list of tables in one round-trip, passed as parallel schema/table arrays
+TABLE_DEFINITIONS_QUERY = text(f"""
+SELECT n.nspname, c.relname, {_COLUMNS_JSON}
+FROM unnest(CAST(:schemas AS TEXT[]), CAST(:tables AS TEXT[])) AS wanted(nspname, relname)
+JOIN pg_class c ON c.relname = wanted.relname
+{_COLUMNS_JOIN}
+WHERE n.nspname = wanted.nspname
+GROUP BY n.nspname, c.relname
+""")
+
+# Every column of every user table in one round-trip, in table order
+FULL_CATALOG_QUERY = text(f"""
+SELECT n.nspname, c.relname, {_COLUMNS_JSON}
+FROM pg_class c
+{_COLUMNS_JOIN}
+WHERE c.relkind IN ('r', 'p')
+AND c.relpersistence <> 't'
+AND n.nspname NOT IN ('information_schema', 'pg_catalog', 'pg_toast')
+AND (CAST(:schemas AS TEXT[]) IS NULL OR n.nspname = ANY(CAST(:schemas AS TEXT[])))
+GROUP BY n.nspname, c.relname
+ORDER BY n.nspname, c.relname
+""")
+
+# Maximum number of rows execute_sql_query returns to the agent
+MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "10000"))
+
+# Trailing row appended to a result cut off at MAX_ROWS
+_TRUNCATED_MARKER = {
+    "truncated": True,
+    "message": f"Only the first {MAX_ROWS} rows are shown. Aggregate in SQL or add filters to see the rest."
+}
+
+# Rows fetched per round-trip when streaming query results
+STREAM_BATCH_SIZE = 1000
+
+# PostgreSQL type OID of NUMERIC, which the driver returns as Decimal
+NUMERIC_TYPE_OID = 1700
+
+# Column types and names analyze_columns picks without asking the LLM
+_DATE_TYPES = ("date", "timestamp")
+_AMOUNT_TYPES = frozenset({"numeric", "double precision", "real", "integer", "bigint", "smallint", "money"})
+_AMOUNT_NAME = re.compile(r"sale|amount|total|price", re.IGNORECASE)
+
+# Schema listings longer than this are trimmed to query-relevant tables before analysis
+SCHEMA_PROMPT_LIMIT = 4000
+_WORD = re.compile(r"[^\W_]+")
+
+# Statements that start like a read; _reads_only() confirms it from the parsed tree
+_READ_QUERY = re.compile(r"^\s*(SELECT|WITH|VALUES)\b", re.IGNORECASE)
+
+# Catalog metadata rarely changes, so cache it (five minutes by default)
+SCHEMA_CACHE_TTL = int(os.getenv("SCHEMA_CACHE_TTL", "300"))
+_schema_cache = TTLCache(maxsize=1, ttl=SCHEMA_CACHE_TTL)
+_table_def_cache = TTLCache(maxsize=512, ttl=SCHEMA_CACHE_TTL)
+_catalog_cache = TTLCache(maxsize=64, ttl=SCHEMA_CACHE_TTL)
+_cache_lock = threading.Lock()
+
+# Rows returned by recent read queries, keyed by canonical SQL and params
+_result_cache = TTLCache(maxsize=512, ttl=int(os.getenv("QUERY_CACHE_TTL", "60")))
+_result_cache_lock = threading.Lock()
+
+# Read queries currently running, keyed like _result_cache, so concurrent duplicates wait
+# for the first instead of querying again (thread futures for the sync path, asyncio futures
+# for the event loop's async path)
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+_ainflight: Dict[str, asyncio.Future] = {}
+_WHITESPACE = re.compile(r"\s+")
+
+# Prompt -> shared LLM chains for the analysis tools
+schema_chain = SCHEMA_PROMPT | ANALYSIS_LLM
+columns_chain = COLUMNS_PROMPT | ANALYSIS_LLM
+columns_bulk_chain = COLUMNS_BULK_PROMPT | ANALYSIS_JSON_LLM
+
+@cached(_schema_cache, lock=_cache_lock)
+def _get_db_schema_and_tables() -> Dict[str, List[str]]:
+    """Read all schemas and their tables (including materialized views) from the database catalog."""
+    with engine.connect() as conn:
+        result = defaultdict(list)
+        for schema, table in conn.execute(SCHEMA_TABLES_QUERY):
+            result[schema].append(table)
+        
+        return dict(result)
+
+@cached(_table_def_cache, lock=_cache_lock)
+def _get_table_definition(schema_name: str, table: str) -> List[Dict[str, Any]]:
+    """Read the column definitions of a table from the database catalog."""
+    with engine.connect() as conn:
+        return conn.execute(
+            TABLE_DEFINITION_QUERY, {"schema_name": schema_name, "table": table}
+        ).scalar_one()
+
+def _get_table_definitions(pairs: List[Tuple[str, str]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Read the column definitions of several tables, fetching the uncached ones in a single query."""
+    definitions: Dict[str, List[Dict[str, Any]]] = {}
+    missing = []
+    with _cache_lock:
+        for schema_name, table in pairs:
+            columns = _table_def_cache.get(hashkey(schema_name, table))
+            if columns is None:
+                missing.append((schema_name, table))
+            else:
+                definitions[f"{schema_name}.{table}"] = columns
+    if not missing:
+        return definitions
+
+    fetched: Dict[Tuple[str, str], List[Dict[str, Any]]] = {pair: [] for pair in missing}
+    with engine.connect() as conn:
+        rows = conn.execute(
+            TABLE_DEFINITIONS_QUERY,
+            {"schemas": [schema for schema, _ in missing], "tables": [table for _, table in missing]}
+        )
+        for schema, table, columns in rows:
+            fetched[(schema, table)] = columns
+
+    with _cache_lock:
+        for (schema_name, table), columns in fetched.items():
+            _table_def_cache[hashkey(schema_name, table)] = columns
+            definitions[f"{schema_name}.{table}"] = columns
+    return definitions
+
+@cached(_catalog_cache, lock=_cache_lock)
+def _get_full_catalog(schemas: Optional[Tuple[str, ...]] = None) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """Read the columns of every table, optionally limited to some schemas, from the database catalog."""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            FULL_CATALOG_QUERY, {"schemas": list(schemas) if schemas else None}
+        )
+        
+        catalog: Dict[str, Dict[str, List[Dict[str, Any]]]] = defaultdict(dict)
+        for schema, table, columns in rows:
+            catalog[schema][table] = columns
+        
+        return dict(catalog)
+
+def invalidate_schema_cache() -> None:
+    """Drop all cached catalog metadata, e.g. after a DDL statement."""
+    with _cache_lock:
+        _schema_cache.clear()
+        _table_def_cache.clear()
+        _catalog_cache.clear()
+
+def list_tables() -> Set[str]:
+    """Return every table name in the database, both plain and schema-qualified."""
+    tables = set()
+    for schema, schema_tables in _get_db_schema_and_tables().items():
+        for table in schema_tables:
+            tables.add(table)
+            tables.add(f"{schema}.{table}")
+    return tables
 
 @tool
 def get_db_schema_and_tables() -> Dict[str, List[str]]:
     """Get all schemas and their tables from the database."""
     try:
-        with engine.connect() as conn:
-            # Get all schemas
-            schemas_query = text("""
-            SELECT DISTINCT table_schema 
-            FROM information_schema.tables 
-            WHERE table_schema NOT IN ('information_schema', 'pg_catalog')
-            """)
-            schemas = conn.execute(schemas_query).fetchall()
-            
-            # Get tables for each schema
-            result = {}
-            for schema in schemas:
-                tables_query = text(f"""
-                SELECT table_name 
-                FROM information_schema.tables 
-                WHERE table_schema = '{schema[0]}'
-                """)
-                tables = conn.execute(tables_query).fetchall()
-                result[schema[0]] = [table[0] for table in tables]
-            
-            return result
+        return _get_db_schema_and_tables()
     except Exception as e:
-        print(f"Error getting schema and tables: {str(e)}")
+        logger.error("Error getting schema and tables: %s", e)
         return {}
 
 @tool
 def get_table_definition(schema_name: str, table: str) -> List[Dict[str, Any]]:
     """Get the definition of a specific table including column names and types."""
     try:
-        with engine.connect() as conn:
-            query = text(f"""
-            SELECT 
-                column_name,
-                data_type,
-                is_nullable,
-                column_default
-            FROM information_schema.columns
-            WHERE table_schema = '{schema_name}'
-            AND table_name = '{table}'
-            ORDER BY ordinal_position
-            """)
-            columns = conn.execute(query).fetchall()
-            
-            return [
-                {
-                    "name": col[0],
-                    "type": col[1],
-                    "nullable": col[2],
-                    "default": col[3]
-                }
-                for col in columns
-            ]
+        return _get_table_definition(schema_name, table)
     except Exception as e:
-        print(f"Error getting table definition: {str(e)}")
+        logger.error("Error getting table definition: %s", e)
         return []
 
 @tool
-def execute_sql_query(query: str) -> List[Dict[str, Any]]:
-    """Execute a SQL query and return the results."""
+def get_table_definitions(tables: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Get the column definitions of several tables in one call, as {"schema.table": [columns]}. Unqualified names are looked up in the public schema."""
     try:
-        with engine.connect() as conn:
-            # Execute the query
-            result = conn.execute(text(query))
-            
-            # Get column names from the result
-            columns = result.keys()
-            
-            # Convert rows to dictionaries
-            rows = []
-            for row in result:
-                row_dict = {}
-                for i, col in enumerate(columns):
-                    # Convert any numeric types to float for JSON serialization
-                    value = row[i]
-                    if isinstance(value, (int, float)):
-                        value = float(value)
-                    row_dict[col] = value
-                rows.append(row_dict)
-            
-            return rows
+        pairs = [tuple(name.split(".", 1)) if "." in name else ("public", name) for name in tables]
+        return _get_table_definitions(pairs)
     except Exception as e:
-        print(f"Error executing query: {str(e)}")
-        return []
+        logger.error("Error getting table definitions: %s", e)
+        return {}
+
+@tool
+def get_full_catalog(schemas: Optional[List[str]] = None) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """Get every table and its column definitions in one call, as {schema: {table: [columns]}}. Optionally limit to the given schemas."""
+    try:
+        return _get_full_catalog(tuple(sorted(schemas)) if schemas else None)
+    except Exception as e:
+        logger.error("Error getting full catalog: %s", e)
+        return {}
 
 @tool
-def analyze_schema(schema_info: str, user_query: str) -> str:
-    """Analyze the provided schema information and user query, and return suggestions for relevant tables or columns."""
-    prompt = f"""
-    You are a database expert. Given the following schema information:
-    {schema_info}
-    And the user query: "{user_query}"
-    Suggest the most relevant tables and columns to answer the query. Explain your reasoning.
+def refresh_schema_cache() -> str:
+    """Clear the cached schemas and table definitions so the next lookups read the live database catalog."""
+    invalidate_schema_cache()
+    return "Schema cache cleared"
+
+_READ_ONLY_TRANSACTION = text("SET TRANSACTION READ ONLY")
+
+# Nodes that make a statement write, even inside a CTE of a SELECT
+_WRITE_NODES = (exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Into)
+
+@functools.lru_cache(maxsize=1024)
+def _parse_sql(query: str) -> Optional[exp.Expression]:
+    """Parse a single Postgres statement, or return None if sqlglot can't."""
+    try:
+        return sqlglot.parse_one(query, read="postgres")
+    except SqlglotError:
+        return None
+
+def _reads_only(query: str) -> bool:
+    """Return True if a statement only reads data, so it can run on a server-side cursor.
+
+    Data-modifying CTEs (WITH x AS (DELETE ... RETURNING *) SELECT ...) and SELECT INTO
+    start like reads but write; statements sqlglot can't parse are treated as writes.
     """
-    response = llm.invoke(prompt)
+    if not _READ_QUERY.match(query):
+        return False
+    tree = _parse_sql(query)
+    return tree is not None and tree.find(*_WRITE_NODES) is None
+
+def _run_query(conn: Connection, query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Run a query on an open connection and return its rows as JSON-friendly dicts."""
+    # Agent SQL runs in a read-only transaction that is rolled back on close, so a
+    # generated INSERT, UPDATE, DELETE or DDL statement fails instead of changing data
+    conn.execute(_READ_ONLY_TRANSACTION)
+    # Stream read queries through a server-side cursor so memory stays bounded
+    if _reads_only(query):
+        conn = conn.execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE)
+    result = conn.execute(text(query), params or {})
+    
+    if not result.returns_rows:
+        return []
+    
+    # Only NUMERIC columns need converting (Decimal -> float) for JSON serialization
+    numeric_columns = {
+        column[0] for column in result.cursor.description
+        if column[1] == NUMERIC_TYPE_OID
+    }
+    
+    # Fetch up to MAX_ROWS rows in bulk, with one extra to detect truncation
+    rows = result.mappings().fetchmany(MAX_ROWS + 1)
+    truncated = len(rows) > MAX_ROWS
+    if truncated:
+        logger.warning("Query returned more than %d rows; truncating", MAX_ROWS)
+        rows = rows[:MAX_ROWS]
+    
+    if not numeric_columns:
+        records = [dict(row) for row in rows]
+    else:
+        records = [
+            {
+                col: float(value) if col in numeric_columns and value is not None else value
+                for col, value in row.items()
+            }
+            for row in rows
+        ]
+    
+    # Tell the agent the rows are incomplete rather than letting it answer from a partial result
+    if truncated:
+        records.append(_TRUNCATED_MARKER)
+    return records
+
+def _is_read_query(query: str, params: Optional[Dict[str, Any]] = None) -> bool:
+    """Return True for queries that only read data and so may be memoized and cached."""
+    return _reads_only(query)
+
+def invalidate_query_cache() -> None:
+    """Drop all cached query results, e.g. after a write."""
+    with _result_cache_lock:
+        _result_cache.clear()
+
+@functools.lru_cache(maxsize=1024)
+def _canonical_sql(query: str) -> str:
+    """Render a query in one canonical Postgres form, so formatting and keyword case don't split cache entries."""
+    # Literals are kept: queries that differ only in their constants return different rows
+    tree = _parse_sql(query)
+    if tree is None:
+        return _WHITESPACE.sub(" ", query.strip())
+    return tree.sql(dialect="postgres")
+
+def _result_key(query: str, params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """Return the result-cache key of a read query, or None for anything else."""
+    if not _is_read_query(query):
+        return None
+    return json.dumps([_canonical_sql(query), params or {}], sort_keys=True, default=str)
+
+def _cached_result(key: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+    """Return the cached rows for a read query's key, if any."""
+    if key is None:
+        return None
+    with _result_cache_lock:
+        return _result_cache.get(key)
+
+def _cache_result(key: Optional[str], rows: List[Dict[str, Any]]) -> None:
+    """Remember the rows a read query returned."""
+    if key is not None:
+        with _result_cache_lock:
+            _result_cache[key] = rows
+
+# SQLSTATE 57014 (query_canceled) is raised when statement_timeout fires
+_QUERY_CANCELED = "57014"
+_TIMEOUT_ERROR = {
+    "error": "timeout",
+    "message": f"Query cancelled after {STATEMENT_TIMEOUT_MS} ms. Narrow the filters or aggregate in SQL and retry."
+}
+
+def _is_timeout(error: Exception) -> bool:
+    """Return True if the error is Postgres cancelling the statement.
+
+    SQLAlchemy wraps driver errors (psycopg2 sets pgcode, psycopg 3 sets sqlstate), but
+    asyncpg errors raised while streaming through run_sync arrive unwrapped with sqlstate.
+    """
+    orig = getattr(error, "orig", None) or error
+    return (getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)) == _QUERY_CANCELED
+
+@memoize_per_turn(cacheable=_is_read_query)
+def _execute_sql_query(query: str, params: Optional[Dict[str, Any]] = None) -> Union[List[Dict[str, Any]], Dict[str, str]]:
+    """Execute a SQL query on the sync engine."""
+    key = _result_key(query, params)
+    rows = _cached_result(key)
+    if rows is not None:
+        return rows
+    if key is None:
+        return _fetch_rows(query, params, key)
+
+    # Identical reads already running on another thread share that thread's result
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        return future.result()
+    try:
+        rows = _fetch_rows(query, params, key)
+        future.set_result(rows)
+        return rows
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+def _fetch_rows(query: str, params: Optional[Dict[str, Any]], key: Optional[str]) -> Union[List[Dict[str, Any]], Dict[str, str]]:
+    """Run a query on the sync engine and cache the rows of a successful read."""
+    try:
+        with engine.connect() as conn:
+            rows = _run_query(conn, query, params)
+    except Exception as e:
+        if _is_timeout(e):
+            logger.warning("Query cancelled by statement timeout: %s", query)
+            return _TIMEOUT_ERROR
+        logger.error("Error executing query: %s", e)
+        return {"error": "query_failed", "message": f"Query failed: {e}"}
+    _cache_result(key, rows)
+    return rows
+
+@memoize_per_turn(cacheable=_is_read_query)
+async def _aexecute_sql_query(query: str, params: Optional[Dict[str, Any]] = None) -> Union[List[Dict[str, Any]], Dict[str, str]]:
+    """Execute a SQL query on the asyncpg engine without blocking the event loop."""
+    key = _result_key(query, params)
+    rows = _cached_result(key)
+    if rows is not None:
+        return rows
+    if key is None:
+        return await _afetch_rows(query, params, key)
+
+    # Identical reads already awaited by another tool call share that call's fetch. The fetch
+    # runs as its own task that nobody cancels; each caller only shields its own wait, so a
+    # disconnecting client never aborts another session's turn
+    task = _ainflight.get(key)
+    if task is None:
+        task = _ainflight[key] = asyncio.ensure_future(_afetch_rows(query, params, key))
+        task.add_done_callback(functools.partial(_forget_inflight, key))
+    return await asyncio.shield(task)
+
+def _forget_inflight(key: str, task: asyncio.Future) -> None:
+    """Drop a finished shared fetch from _ainflight, unless a newer one already took its key."""
+    if _ainflight.get(key) is task:
+        del _ainflight[key]
+
+async def _afetch_rows(query: str, params: Optional[Dict[str, Any]], key: Optional[str]) -> Union[List[Dict[str, Any]], Dict[str, str]]:
+    """Run a query on the asyncpg engine and cache the rows of a successful read."""
+    try:
+        async with async_engine.connect() as conn:
+            rows = await conn.run_sync(_run_query, query, params)
+    except Exception as e:
+        if _is_timeout(e):
+            logger.warning("Query cancelled by statement timeout: %s", query)
+            return _TIMEOUT_ERROR
+        logger.error("Error executing query: %s", e)
+        return {"error": "query_failed", "message": f"Query failed: {e}"}
+    _cache_result(key, rows)
+    return rows
+
+execute_sql_query = StructuredTool.from_function(
+    func=_execute_sql_query,
+    coroutine=_aexecute_sql_query,
+    name="execute_sql_query",
+    description="Execute a read-only SQL query and return the results. Statements that change data or the schema are rejected. Pass values as :name placeholders in the query with a matching params dict."
+)
+
+def _compact_columns(columns: List[Dict[str, Any]]) -> str:
+    """Render column definitions as one "name:type" line each, with "?" marking nullable columns."""
+    return "\n".join(
+        f"{c.get('name')}:{c.get('type')}{'?' if c.get('nullable') == 'YES' else ''}" for c in columns
+    )
+
+def _relevant_schema(schema_info: str, user_query: str) -> str:
+    """Trim a large {schema: [tables]} listing to the tables sharing a word with the query."""
+    if len(schema_info) <= SCHEMA_PROMPT_LIMIT:
+        return schema_info
+    try:
+        schemas = orjson.loads(schema_info)
+        query_words = set(_WORD.findall(user_query.lower()))
+        relevant = {
+            schema: matches
+            for schema, tables in schemas.items()
+            if (matches := [t for t in tables if query_words & set(_WORD.findall(t.lower()))])
+        }
+    except (ValueError, AttributeError, TypeError):
+        return schema_info
+    return orjson.dumps(relevant).decode() if relevant else schema_info
+
+def _match_columns(columns: List[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+    """Pick the date and amount columns by type and name, or return None if either is missing."""
+    # Most tables name their date and amount columns predictably, so try that first
+    date_column = next(
+        (c["name"] for c in columns if str(c.get("type", "")).lower().startswith(_DATE_TYPES)), None
+    )
+    amount_column = next(
+        (
+            c["name"] for c in columns
+            if _AMOUNT_NAME.search(c.get("name", "")) and str(c.get("type", "")).lower().split("(")[0] in _AMOUNT_TYPES
+        ),
+        None
+    )
+    if date_column and amount_column:
+        return {"date_column": date_column, "amount_column": amount_column}
+    return None
+
+def _pick_columns(columns: List[Dict[str, Any]]) -> Optional[str]:
+    """Return the heuristic column pick as a JSON string, or None if it found no pair."""
+    picked = _match_columns(columns)
+    return orjson.dumps(picked).decode() if picked else None
+
+def _split_bulk_columns(
+    table_definitions: Dict[str, List[Dict[str, Any]]]
+) -> Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+    """Resolve what the heuristic can and return those picks plus the tables left for the LLM."""
+    picks = []
+    unresolved = {}
+    for table, columns in table_definitions.items():
+        picked = _match_columns(columns)
+        if picked:
+            picks.append({"table": table, **picked, "reason": "Matched by column type and name"})
+        else:
+            unresolved[table] = columns
+    return picks, unresolved
+
+def _bulk_columns_input(unresolved: Dict[str, List[Dict[str, Any]]], user_query: str) -> Dict[str, str]:
+    """Render the unresolved tables as one prompt input, a "## table" header above each column list."""
+    tables = "\n\n".join(f"## {table}\n{_compact_columns(columns)}" for table, columns in unresolved.items())
+    return {"tables": tables, "user_query": user_query}
+
+def _bulk_columns_failed(unresolved: Dict[str, List[Dict[str, Any]]], error: Exception) -> List[Dict[str, Any]]:
+    """Report each unresolved table as unpicked when the LLM call fails."""
+    logger.error("Error analyzing columns in bulk: %s", error)
+    return [
+        {"table": table, "date_column": None, "amount_column": None, "reason": f"Error analyzing columns: {error}"}
+        for table in unresolved
+    ]
+
+@memoize_per_turn
+def _analyze_schema(schema_info: str, user_query: str) -> str:
+    """Suggest relevant tables and columns for a query."""
+    response = schema_chain.invoke({"schema_info": _relevant_schema(schema_info, user_query), "user_query": user_query})
     return response.content.strip()
 
-@tool
-def analyze_columns(table_definition: str, user_query: str) -> str:
-    """Analyze the provided table definition and user query, and return suggestions for relevant columns (e.g., date, sales amount)."""
+@memoize_per_turn
+async def _aanalyze_schema(schema_info: str, user_query: str) -> str:
+    """Async version of _analyze_schema."""
+    response = await schema_chain.ainvoke({"schema_info": _relevant_schema(schema_info, user_query), "user_query": user_query})
+    return response.content.strip()
+
+@memoize_per_turn
+def _analyze_columns(table_definition: str, user_query: str) -> str:
+    """Suggest the date and amount columns of a table for a query."""
     try:
         # Parse the table definition string back to a list of dictionaries
-        columns = json.loads(table_definition)
-        
-        # Create a more structured prompt
-        prompt = f"""
-        You are a database expert. Given the following table columns:
-        {json.dumps(columns, indent=2)}
+        columns = orjson.loads(table_definition)
         
-        And the user query: "{user_query}"
+        picked = _pick_columns(columns)
+        if picked:
+            return picked
         
-        Please identify:
-        1. The best column for dates (look for timestamp, date, or datetime types)
-        2. The best column for sales amounts (look for numeric types with names containing 'sale', 'amount', 'total', or 'price')
+        response = columns_chain.invoke({"columns": _compact_columns(columns), "user_query": user_query})
+        return response.content.strip()
+    except orjson.JSONDecodeError:
+        return "Error: Invalid table definition format. Please provide a valid JSON string."
+    except Exception as e:
+        return f"Error analyzing columns: {str(e)}"
+
+@memoize_per_turn
+async def _aanalyze_columns(table_definition: str, user_query: str) -> str:
+    """Async version of _analyze_columns."""
+    try:
+        columns = orjson.loads(table_definition)
         
-        For each column you identify, explain why it's the best choice.
-        If you can't find suitable columns, explain why.
-        """
+        picked = _pick_columns(columns)
+        if picked:
+            return picked
         
-        response = llm.invoke(prompt)
+        response = await columns_chain.ainvoke({"columns": _compact_columns(columns), "user_query": user_query})
         return response.content.strip()
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         return "Error: Invalid table definition format. Please provide a valid JSON string."
     except Exception as e:
-        return f"Error analyzing columns: {str(e)}"
\ No newline at end of file
+        return f"Error analyzing columns: {str(e)}"
+
+@memoize_per_turn
+def _analyze_columns_bulk(table_definitions: Dict[str, List[Dict[str, Any]]], user_query: str) -> List[Dict[str, Any]]:
+    """Suggest the date and amount columns of several tables with at most one LLM call."""
+    picks, unresolved = _split_bulk_columns(table_definitions)
+    if not unresolved:
+        return picks
+    try:
+        response = columns_bulk_chain.invoke(_bulk_columns_input(unresolved, user_query))
+        return picks + orjson.loads(response.content).get("tables", [])
+    except Exception as e:
+        return picks + _bulk_columns_failed(unresolved, e)
+
+@memoize_per_turn
+async def _aanalyze_columns_bulk(table_definitions: Dict[str, List[Dict[str, Any]]], user_query: str) -> List[Dict[str, Any]]:
+    """Async version of _analyze_columns_bulk."""
+    picks, unresolved = _split_bulk_columns(table_definitions)
+    if not unresolved:
+        return picks
+    try:
+        response = await columns_bulk_chain.ainvoke(_bulk_columns_input(unresolved, user_query))
+        return picks + orjson.loads(response.content).get("tables", [])
+    except Exception as e:
+        return picks + _bulk_columns_failed(unresolved, e)
+
+analyze_schema = StructuredTool.from_function(
+    func=_analyze_schema,
+    coroutine=_aanalyze_schema,
+    name="analyze_schema",
+    description="Analyze the provided schema information and user query, and return suggestions for relevant tables or columns."
+)
+
+analyze_columns = StructuredTool.from_function(
+    func=_analyze_columns,
+    coroutine=_aanalyze_columns,
+    name="analyze_columns",
+    description="Analyze the provided table definition and user query, and return suggestions for relevant columns (e.g., date, sales amount)."
+)
+
+analyze_columns_bulk = StructuredTool.from_function(
+    func=_analyze_columns_bulk,
+    coroutine=_aanalyze_columns_bulk,
+    name="analyze_columns_bulk",
+    description='Identify the date and amount columns of several tables in one call. Pass table_definitions as {"schema.table": [columns]}, e.g. the output of get_table_definitions.'
+)
@@ -0,0 +1,60 @@
+"""SQLAlchemy engines shared by every database tool."""
+
+import logging
+import os
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from ...config import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+# Initialize database connection
+db_url = DATABASE_URL
+logger.debug("DATABASE_URL configured: %s", "yes" if db_url else "no")
+if not db_url:
+    raise ValueError("DATABASE_URL environment variable is not set")
+
+# Connections per engine; sized for the agent's concurrent tool calls. By default a
+# 20-connection budget is split between the WEB_CONCURRENCY workers, so adding workers
+# does not multiply the server's connection count past max_connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE") or max(20 // int(os.getenv("WEB_CONCURRENCY") or 1), 2))
+DB_MAX_OVERFLOW = DB_POOL_SIZE // 2
+
+# Server-side limits that free a pooled connection from a runaway query or an abandoned transaction
+STATEMENT_TIMEOUT_MS = int(os.getenv("STATEMENT_TIMEOUT_MS", "30000"))
+IDLE_IN_TRANSACTION_TIMEOUT_MS = 30000
+
+# Keep warm connections for concurrent tool calls and bound runaway queries;
+# LIFO checkout reuses the most recently returned (hot) connection first
+engine = create_engine(
+    db_url,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    pool_use_lifo=True,
+    connect_args={
+        "application_name": "balsanagent",
+        "options": (
+            f"-c statement_timeout={STATEMENT_TIMEOUT_MS} "
+            f"-c idle_in_transaction_session_timeout={IDLE_IN_TRANSACTION_TIMEOUT_MS}"
+        )
+    }
+)
+
+# asyncpg engine for the agent's async tool path, so parallel tool calls each
+# check out their own connection and overlap their round-trips
+async_engine = create_async_engine(
+    make_url(db_url).set(drivername="postgresql+asyncpg"),
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    connect_args={
+        "server_settings": {
+            "application_name": "balsanagent",
+            "statement_timeout": str(STATEMENT_TIMEOUT_MS),
+            "idle_in_transaction_session_timeout": str(IDLE_IN_TRANSACTION_TIMEOUT_MS)
+        }
+    }
+)
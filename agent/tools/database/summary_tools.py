@@ -1,46 +1,86 @@
-from typing import Dict, Any
-from langchain.tools import tool
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
-import os
+from typing import Dict, Any, List
+from langchain_core.tools import StructuredTool
+from sqlalchemy import text
+import asyncio
+import logging
+import threading
+from .db_tools import invalidate_query_cache, invalidate_schema_cache
+from .engine import async_engine, engine
 
-# Load environment variables
-load_dotenv(override=True)
+logger = logging.getLogger(__name__)
 
-# Debug: Print environment variables
-print("Environment variables loaded in summary_tools:")
-print(f"DATABASE_URL: {os.getenv('DATABASE_URL')}")
+# Summaries table, created once per process on first save
+CREATE_SUMMARIES_TABLE = text("""
+CREATE TABLE IF NOT EXISTS analysis_summaries (
+    id SERIAL PRIMARY KEY,
+    summary TEXT,
+    query TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+""")
 
-# Initialize database connection
-db_url = os.getenv("DATABASE_URL")
-if not db_url:
-    raise ValueError("DATABASE_URL environment variable is not set")
+INSERT_SUMMARY = text("""
+INSERT INTO analysis_summaries (summary, query)
+VALUES (:summary, :query)
+RETURNING id
+""")
 
-engine = create_engine(db_url)
+# Insert any number of summaries in one statement by unnesting parallel arrays
+INSERT_SUMMARIES = text("""
+INSERT INTO analysis_summaries (summary, query)
+SELECT * FROM unnest(CAST(:summaries AS TEXT[]), CAST(:queries AS TEXT[]))
+RETURNING id
+""")
 
-@tool
-def save_summary(summary: str, query: str) -> Dict[str, Any]:
-    """Save a summary of the analysis results to the database."""
+_summaries_table_ready = False
+_summaries_table_lock = threading.Lock()
+
+def _ensure_summaries_table() -> None:
+    """Create the summaries table the first time this process saves a summary."""
+    global _summaries_table_ready
+    if _summaries_table_ready:
+        return
+    with _summaries_table_lock:
+        if not _summaries_table_ready:
+            with engine.begin() as conn:
+                conn.execute(CREATE_SUMMARIES_TABLE)
+            invalidate_schema_cache()
+            _summaries_table_ready = True
+
+def _summary_params(items: List[Dict[str, str]]) -> Dict[str, List[str]]:
+    """Split summary items into the parallel arrays INSERT_SUMMARIES unnests."""
+    return {
+        "summaries": [item["summary"] for item in items],
+        "queries": [item.get("query", "") for item in items]
+    }
+
+def _save_summary(summary: str, query: str) -> Dict[str, Any]:
+    """Save one summary on the sync engine."""
     try:
-        with engine.connect() as conn:
-            # Create summaries table if it doesn't exist
-            create_table_query = text("""
-            CREATE TABLE IF NOT EXISTS analysis_summaries (
-                id SERIAL PRIMARY KEY,
-                summary TEXT,
-                query TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
-            conn.execute(create_table_query)
+        _ensure_summaries_table()
+        with engine.begin() as conn:
+            result = conn.execute(INSERT_SUMMARY, {"summary": summary, "query": query}).fetchone()
+            invalidate_query_cache()
             
-            # Insert the summary
-            insert_query = text("""
-            INSERT INTO analysis_summaries (summary, query)
-            VALUES (:summary, :query)
-            RETURNING id
-            """)
-            result = conn.execute(insert_query, {"summary": summary, "query": query}).fetchone()
+            return {
+                "success": True,
+                "id": result[0],
+                "message": "Summary saved successfully"
+            }
+    except Exception as e:
+        logger.error("Error saving summary: %s", e)
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+async def _asave_summary(summary: str, query: str) -> Dict[str, Any]:
+    """Save one summary on the asyncpg engine."""
+    try:
+        await asyncio.to_thread(_ensure_summaries_table)
+        async with async_engine.begin() as conn:
+            result = (await conn.execute(INSERT_SUMMARY, {"summary": summary, "query": query})).fetchone()
+            invalidate_query_cache()
             
             return {
                 "success": True,
@@ -48,8 +88,62 @@ def save_summary(summary: str, query: str) -> Dict[str, Any]:
                 "message": "Summary saved successfully"
             }
     except Exception as e:
-        print(f"Error saving summary: {str(e)}")
+        logger.error("Error saving summary: %s", e)
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+def _save_summaries(items: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Save a batch of summaries on the sync engine."""
+    try:
+        _ensure_summaries_table()
+        with engine.begin() as conn:
+            ids = conn.execute(INSERT_SUMMARIES, _summary_params(items)).scalars().all()
+            invalidate_query_cache()
+            
+            return {
+                "success": True,
+                "ids": ids,
+                "message": f"{len(ids)} summaries saved successfully"
+            }
+    except Exception as e:
+        logger.error("Error saving summaries: %s", e)
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+async def _asave_summaries(items: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Save a batch of summaries on the asyncpg engine."""
+    try:
+        await asyncio.to_thread(_ensure_summaries_table)
+        async with async_engine.begin() as conn:
+            ids = (await conn.execute(INSERT_SUMMARIES, _summary_params(items))).scalars().all()
+            invalidate_query_cache()
+            
+            return {
+                "success": True,
+                "ids": ids,
+                "message": f"{len(ids)} summaries saved successfully"
+            }
+    except Exception as e:
+        logger.error("Error saving summaries: %s", e)
         return {
             "success": False,
             "error": str(e)
-        } 
\ No newline at end of file
+        }
+
+save_summary = StructuredTool.from_function(
+    func=_save_summary,
+    coroutine=_asave_summary,
+    name="save_summary",
+    description="Save a summary of the analysis results to the database."
+)
+
+save_summaries = StructuredTool.from_function(
+    func=_save_summaries,
+    coroutine=_asave_summaries,
+    name="save_summaries",
+    description='Save several analysis summaries at once. Each item is {"summary": ..., "query": ...}.'
+)
@@ -1,43 +1,137 @@
-from typing import Any, List
+import functools
+import re
+from typing import Any, Dict, Iterable, List, Optional
 
-def detect_suspicious_transactions(execute_sql_query, table: str, amount_threshold: float = 100000.0) -> str:
+# Plain or schema-qualified table name; anything else is rejected before it reaches SQL
+_TABLE_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?")
+
+def aggregate_view_name(table: str) -> str:
+    """Return the name of the daily per-user materialized view for a transactions table."""
+    return f"{table}_daily_user_tx"
+
+def fraud_aggregate_ddl(table: str) -> List[str]:
+    """
+    Return the statements that prebuild indexes and aggregates for fraud sweeps on a table.
+    Creates partial indexes for the large-amount and night-time probes, a (user_id, timestamp)
+    index that lets the windowed rapid-user probe skip its sort, and a materialized view of
+    daily per-user transaction counts. The night-time index
+    requires a timestamp column without time zone.
+    """
+    view = aggregate_view_name(table)
+    base = view.split(".")[-1]
+    return [
+        f"CREATE INDEX IF NOT EXISTS ix_{base}_large_amount ON {table} (amount) WHERE amount > 10000",
+        f"CREATE INDEX IF NOT EXISTS ix_{base}_night ON {table} (timestamp) "
+        f"WHERE EXTRACT(HOUR FROM timestamp) BETWEEN 0 AND 5",
+        f"CREATE INDEX IF NOT EXISTS ix_{base}_user_time ON {table} (user_id, timestamp)",
+        f"""CREATE MATERIALIZED VIEW IF NOT EXISTS {view} AS
+            SELECT user_id, date_trunc('day', timestamp) AS day, COUNT(*) AS tx_count,
+                   MIN(timestamp) AS first_tx, MAX(timestamp) AS last_tx
+            FROM {table}
+            GROUP BY user_id, date_trunc('day', timestamp)""",
+        f"CREATE UNIQUE INDEX IF NOT EXISTS {base}_key ON {view} (user_id, day)",
+        f"CREATE INDEX IF NOT EXISTS {base}_day_count ON {view} (day, tx_count DESC)",
+    ]
+
+def fraud_aggregate_refresh_sql(table: str) -> str:
+    """Return the statement that refreshes a table's fraud aggregates without blocking readers."""
+    return f"REFRESH MATERIALIZED VIEW CONCURRENTLY {aggregate_view_name(table)}"
+
+@functools.lru_cache(maxsize=256)
+def _probe_queries(table: str, use_aggregates: bool) -> Dict[str, str]:
+    """Build the fraud-probe statements for a validated table, keyed by probe; built once per table.
+
+    Each statement returns its rows as JSON tagged with the probe name.
+    """
+    if use_aggregates:
+        rapid_query = f"""SELECT user_id, tx_count, first_tx, last_tx
+            FROM {aggregate_view_name(table)}
+            WHERE day = CURRENT_DATE AND tx_count > 5
+            ORDER BY tx_count DESC
+            LIMIT 5"""
+    else:
+        # One windowed pass over rows sorted by (user_id, timestamp), keeping the first row per user
+        rapid_query = f"""SELECT user_id, tx_count, first_tx, last_tx
+            FROM (
+                SELECT user_id,
+                       COUNT(*) OVER w AS tx_count,
+                       MIN(timestamp) OVER w AS first_tx,
+                       MAX(timestamp) OVER w AS last_tx,
+                       ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY timestamp) AS rn
+                FROM {table}
+                WHERE timestamp >= NOW() - INTERVAL '1 day'
+                WINDOW w AS (PARTITION BY user_id)
+            ) per_user
+            WHERE rn = 1 AND tx_count > 5
+            ORDER BY tx_count DESC
+            LIMIT 5"""
+
+    probes = {
+        # 1. Large transactions
+        "large": f"""SELECT * FROM {table}
+            WHERE amount > :amount_threshold
+            ORDER BY amount DESC
+            LIMIT 5""",
+        # 2. Transactions at odd hours (e.g., between 00:00 and 05:00)
+        "odd_hour": f"""SELECT * FROM {table}
+            WHERE EXTRACT(HOUR FROM timestamp) BETWEEN 0 AND 5
+            ORDER BY timestamp DESC
+            LIMIT 5""",
+        # 3. Multiple transactions from same user in 1 day
+        "rapid": rapid_query,
+    }
+    return {
+        probe: f"SELECT '{probe}' AS probe, to_jsonb(t) AS row FROM ({query}) t"
+        for probe, query in probes.items()
+    }
+
+@functools.lru_cache(maxsize=256)
+def _probe_query(table: str, use_aggregates: bool) -> str:
+    """Build the combined fraud-probe statement that runs all probes in one round-trip."""
+    return "\nUNION ALL\n".join(_probe_queries(table, use_aggregates).values())
+
+def _error_message(error: Dict[str, str]) -> str:
+    """Format an error dict returned by execute_sql_query for the report."""
+    return f"Error: {error.get('message', error.get('error'))}"
+
+def detect_suspicious_transactions(
+    execute_sql_query,
+    table: str,
+    amount_threshold: float = 100000.0,
+    allowed_tables: Optional[Iterable[str]] = None,
+    use_aggregates: bool = False
+) -> str:
     """
     Detects potentially suspicious transactions in the given table.
     Flags:
       - Transactions above a high amount threshold
       - Transactions at unusual hours (e.g., late night)
       - Multiple transactions from the same user in a short time
+    execute_sql_query is called as execute_sql_query(query, params).
+    If allowed_tables is given, the table must be one of them.
+    With use_aggregates, the rapid-user probe reads today's counts from the
+    materialized view created by fraud_aggregate_ddl instead of scanning the table.
     Returns a summary string.
     """
-    # 1. Large transactions
-    large_tx_query = f"""
-        SELECT * FROM {table}
-        WHERE amount > {amount_threshold}
-        ORDER BY amount DESC
-        LIMIT 5
-    """
-    large_tx = execute_sql_query(large_tx_query)
-
-    # 2. Transactions at odd hours (e.g., between 00:00 and 05:00)
-    odd_hour_query = f"""
-        SELECT * FROM {table}
-        WHERE EXTRACT(HOUR FROM timestamp) BETWEEN 0 AND 5
-        ORDER BY timestamp DESC
-        LIMIT 5
-    """
-    odd_hour_tx = execute_sql_query(odd_hour_query)
-
-    # 3. Multiple transactions from same user in 1 day
-    rapid_tx_query = f"""
-        SELECT user_id, COUNT(*) as tx_count, MIN(timestamp) as first_tx, MAX(timestamp) as last_tx
-        FROM {table}
-        WHERE timestamp >= NOW() - INTERVAL '1 day'
-        GROUP BY user_id
-        HAVING COUNT(*) > 5
-        ORDER BY tx_count DESC
-        LIMIT 5
-    """
-    rapid_tx = execute_sql_query(rapid_tx_query)
+    table = table.strip()
+    if not _TABLE_NAME.fullmatch(table) or (allowed_tables is not None and table not in allowed_tables):
+        return f"Error: Unknown table '{table}'. Use get_db_schema_and_tables to find valid table names."
+
+    params = {"amount_threshold": amount_threshold}
+    findings: Dict[str, Any] = {"large": [], "odd_hour": [], "rapid": []}
+    rows = execute_sql_query(_probe_query(table, use_aggregates), params)
+    if isinstance(rows, dict):
+        # One failing probe fails the combined statement; rerun them separately so the
+        # report shows which probe failed instead of hiding the others' findings
+        for probe, query in _probe_queries(table, use_aggregates).items():
+            probe_rows = execute_sql_query(query, params)
+            findings[probe] = _error_message(probe_rows) if isinstance(probe_rows, dict) else [row["row"] for row in probe_rows if "row" in row]
+    else:
+        # Skip the marker row a result cut off at SQL_MAX_ROWS ends with
+        for row in rows:
+            if "probe" in row:
+                findings[row["probe"]].append(row["row"])
+    large_tx, odd_hour_tx, rapid_tx = findings["large"], findings["odd_hour"], findings["rapid"]
 
     result = "Fraud Analysis Report:\n"
     result += f"\nLarge transactions (>{amount_threshold}):\n" + (str(large_tx) if large_tx else "None found")
@@ -0,0 +1,59 @@
+"""Per-turn memoization of read-only tool calls."""
+
+import functools
+import inspect
+import json
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+# Results of the tool calls made during the current chat turn, keyed by (tool, args)
+_turn_cache: ContextVar[Optional[Dict[str, Any]]] = ContextVar("tool_turn_cache", default=None)
+
+def start_turn() -> None:
+    """Begin a new chat turn with an empty tool result cache."""
+    _turn_cache.set({})
+
+def invalidate_turn() -> None:
+    """Forget the results memoized so far in this turn, e.g. after a write."""
+    cache = _turn_cache.get()
+    if cache is not None:
+        cache.clear()
+
+def _cache_key(func: Callable, args: tuple, kwargs: Dict[str, Any]) -> str:
+    """Build a stable key from a function's name and its bound arguments."""
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return json.dumps([func.__qualname__, bound.arguments], sort_keys=True, default=str)
+
+def memoize_per_turn(func: Optional[Callable] = None, *, cacheable: Optional[Callable[..., bool]] = None) -> Callable:
+    """Reuse a tool's result when the agent repeats the exact same call within one turn.
+
+    cacheable, if given, is called with the tool's arguments and decides whether
+    this particular call may be memoized (e.g. only read-only queries). Outside of
+    a turn started with start_turn() calls pass straight through.
+    """
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                cache = _turn_cache.get()
+                if cache is None or (cacheable and not cacheable(*args, **kwargs)):
+                    return await func(*args, **kwargs)
+                key = _cache_key(func, args, kwargs)
+                if key not in cache:
+                    cache[key] = await func(*args, **kwargs)
+                return cache[key]
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = _turn_cache.get()
+            if cache is None or (cacheable and not cacheable(*args, **kwargs)):
+                return func(*args, **kwargs)
+            key = _cache_key(func, args, kwargs)
+            if key not in cache:
+                cache[key] = func(*args, **kwargs)
+            return cache[key]
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Maintain the prebuilt fraud-analysis aggregates for transaction tables.
+
+Usage:
+    python fraud_aggregates.py create <table> [<table> ...]
+    python fraud_aggregates.py refresh <table> [<table> ...]
+
+Run "create" once per transactions table, then schedule "refresh" (e.g. hourly
+from cron). Once a table's aggregates exist, detect_suspicious_transactions
+reads the rapid-user counts from them instead of scanning the table (running
+agents notice new views once their five-minute schema cache expires).
+"""
+
+import sys
+from sqlalchemy import text
+from agent.tools.database.engine import engine
+from agent.tools.fraud_analysis import fraud_aggregate_ddl, fraud_aggregate_refresh_sql
+
+def create(table: str):
+    """Create the partial indexes and materialized view for a table"""
+    with engine.begin() as conn:
+        for statement in fraud_aggregate_ddl(table):
+            conn.execute(text(statement))
+    print(f"✅ Created fraud aggregates for {table}")
+
+def refresh(table: str):
+    """Refresh the materialized view for a table"""
+    # REFRESH ... CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(fraud_aggregate_refresh_sql(table)))
+    print(f"✅ Refreshed fraud aggregates for {table}")
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("create", "refresh"):
+        print(__doc__)
+        sys.exit(1)
+
+    command = create if sys.argv[1] == "create" else refresh
+    for table in sys.argv[2:]:
+        command(table)
+
+if __name__ == "__main__":
+    main()
@@ -3,46 +3,113 @@ FastAPI wrapper for the LangGraph chat agent with streaming support
 Provides REST API endpoints for Next.js frontend integration
 """
 
-import uuid
-import json
+import os
 import asyncio
-from typing import Dict, List, Optional
-from fastapi import FastAPI, HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+from cachetools import TTLCache
+from fastapi import FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+import orjson
 import uvicorn
 import logging
 
-from agent.langgraph_workflow import handle_chat, get_chat_history
+from agent.chat_handler import create_session_id
+from agent.langgraph_workflow import (
+    ahandle_chat,
+    clear_chat_history,
+    get_chat_history,
+    list_chat_sessions,
+    stream_chat as stream_agent_chat
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Size the thread pool used for blocking work offloaded from the event loop."""
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=32))
+    yield
+
 # Initialize FastAPI app
 app = FastAPI(
     title="AI Business Advisor API with Streaming",
     description="REST API for the AI Business Advisor chat agent with streaming support",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+
+# Origins and request headers the Next.js frontend uses
+CORS_ORIGINS = (
+    "http://localhost:3000",  # Next.js default dev server
+    "http://localhost:3001",  # Alternative Next.js port
+    "https://localhost:3000",
+    "https://localhost:3001",
+    # Add your production domains here
+    "https://yourdomain.com",
 )
+CORS_HEADERS = ("Accept", "Authorization", "Content-Type", "Idempotency-Key")
 
 # Configure CORS for Next.js frontend
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",  # Next.js default dev server
-        "http://localhost:3001",  # Alternative Next.js port
-        "https://localhost:3000",
-        "https://localhost:3001",
-        # Add your production domains here
-        "https://yourdomain.com",
-    ],
+    allow_origins=list(CORS_ORIGINS),
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
+    allow_headers=list(CORS_HEADERS),
 )
 
+# Characters of streamed answer text sent per SSE frame, unless a sentence ends first
+STREAM_CHUNK_SIZE = 64
+_SENTENCE_ENDS = (".", "!", "?", "\n", "؟")
+
+# Recent history lookups keyed by session_id; a session's entry is dropped whenever this
+# worker handles a message for it. The TTL bounds staleness for sessions whose messages
+# were handled by another worker.
+_history_cache: TTLCache = TTLCache(maxsize=2048, ttl=30)
+
+# Bumped on every invalidation, so a history read that overlapped one is not cached
+_history_epoch = 0
+
+def _invalidate_history(session_id: str) -> None:
+    """Drop a session's cached history after its conversation changed."""
+    global _history_epoch
+    _history_epoch += 1
+    _history_cache.pop(session_id, None)
+
+# Answers to requests retried with the same Idempotency-Key within the last minute, so a
+# client that retries, or posts to both /api/chat and /api/chat/stream, runs the agent once
+_recent_responses: TTLCache = TTLCache(maxsize=1024, ttl=60)
+
+def _recent_key(session_id: str, idempotency_key: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Key a request for the recent-response cache; requests without an Idempotency-Key are never replayed."""
+    return (session_id, idempotency_key) if idempotency_key else None
+
+# Bodies of the constant endpoints, serialized once
+_HEALTH_BYTES = orjson.dumps({"status": "healthy", "service": "AI Business Advisor API with Streaming"})
+_ROOT_BYTES = orjson.dumps({
+    "message": "AI Business Advisor API with Streaming",
+    "version": "1.0.0",
+    "endpoints": {
+        "health": "/health",
+        "create_session": "POST /api/sessions",
+        "send_message": "POST /api/chat",
+        "stream_message": "POST /api/chat/stream",
+        "get_history": "GET /api/sessions/{session_id}/history",
+        "clear_session": "DELETE /api/sessions/{session_id}"
+    }
+})
+
+def _sse(payload: Dict) -> bytes:
+    """Encode a payload as a server-sent event frame."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
 # Pydantic models for request/response
 class ChatMessage(BaseModel):
     message: str
@@ -68,7 +135,7 @@ class HistoryResponse(BaseModel):
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "AI Business Advisor API with Streaming"}
+    return Response(_HEALTH_BYTES, media_type="application/json")
 
 # Create new chat session
 @app.post("/api/sessions", response_model=SessionResponse)
@@ -78,7 +145,7 @@ async def create_session(request: SessionRequest = None):
         if request and request.session_id:
             session_id = request.session_id
         else:
-            session_id = str(uuid.uuid4())
+            session_id = create_session_id()
         
         logger.info(f"Created/Retrieved session: {session_id}")
         return SessionResponse(session_id=session_id)
@@ -89,19 +156,27 @@ async def create_session(request: SessionRequest = None):
 
 # Send chat message (regular, non-streaming)
 @app.post("/api/chat", response_model=ChatResponse)
-async def send_message(chat_request: ChatMessage):
+async def send_message(chat_request: ChatMessage, idempotency_key: Optional[str] = Header(None)):
     """Send a message to the AI agent and get response"""
     try:
         # Generate session ID if not provided
-        session_id = chat_request.session_id or str(uuid.uuid4())
+        new_session = not chat_request.session_id
+        session_id = chat_request.session_id or create_session_id()
         
         if not chat_request.message.strip():
             raise HTTPException(status_code=400, detail="Message cannot be empty")
         
         logger.info(f"Processing message for session {session_id}: {chat_request.message[:100]}...")
         
-        # Call the chat handler
-        response = handle_chat(chat_request.message, session_id)
+        # Reuse the answer if this request was just handled under the same Idempotency-Key
+        key = _recent_key(session_id, idempotency_key)
+        response = _recent_responses.get(key) if key else None
+        if response is None:
+            # Call the chat handler without blocking the event loop
+            response = await ahandle_chat(chat_request.message, session_id, new_session)
+            _invalidate_history(session_id)
+            if key and isinstance(response, dict) and not response.get("error"):
+                _recent_responses[key] = {**response, "tokens_used": 0}
         
         # Handle response structure
         if isinstance(response, dict):
@@ -131,52 +206,78 @@ async def send_message(chat_request: ChatMessage):
 
 # Streaming chat endpoint
 @app.post("/api/chat/stream")
-async def stream_chat(chat_request: ChatMessage):
-    """Stream response from the AI agent word by word"""
+async def stream_chat(chat_request: ChatMessage, idempotency_key: Optional[str] = Header(None)):
+    """Stream response from the AI agent token by token"""
     async def event_stream():
-        session_id = chat_request.session_id or str(uuid.uuid4())
+        new_session = not chat_request.session_id
+        session_id = chat_request.session_id or create_session_id()
         
         if not chat_request.message.strip():
-            yield f"data: {json.dumps({'error': 'Message cannot be empty', 'session_id': session_id, 'type': 'error'})}\n\n"
+            yield _sse({'error': 'Message cannot be empty', 'session_id': session_id, 'type': 'error'})
             return
         
         try:
             logger.info(f"Streaming message for session {session_id}: {chat_request.message[:100]}...")
             
             # First send session_id
-            yield f"data: {json.dumps({'session_id': session_id, 'type': 'session'})}\n\n"
+            yield _sse({'session_id': session_id, 'type': 'session'})
             
-            # Get the response from the chat handler
-            response = handle_chat(chat_request.message, session_id)
+            # Replay the answer if this request was just handled under the same Idempotency-Key
+            key = _recent_key(session_id, idempotency_key)
+            cached = _recent_responses.get(key) if key else None
+            if cached is not None:
+                yield _sse({'content': cached['response'], 'type': 'content', 'session_id': session_id, 'index': 0})
+                yield _sse({'type': 'done', 'session_id': session_id, 'tokens_used': 0})
+                return
             
-            if isinstance(response, dict):
-                if response.get("error"):
-                    yield f"data: {json.dumps({'error': response['error'], 'session_id': session_id, 'type': 'error'})}\n\n"
-                    return
-                
-                response_text = response.get("response", "No response generated")
-            else:
-                response_text = str(response)
+            # Relay the model's tokens in small chunks, flushed by size or at sentence ends
+            index = 0
+            buffer: List[str] = []
+            buffered = 0
+            try:
+                async for event in stream_agent_chat(chat_request.message, session_id, new_session):
+                    if event["type"] == "error":
+                        yield _sse({'error': event['error'], 'session_id': session_id, 'type': 'error'})
+                        return
+                    
+                    if event["type"] == "content":
+                        buffer.append(event['content'])
+                        buffered += len(event['content'])
+                        if buffered < STREAM_CHUNK_SIZE and not event['content'].rstrip(" ").endswith(_SENTENCE_ENDS):
+                            continue
+                    
+                    if buffer:
+                        chunk_data = {
+                            'content': "".join(buffer),
+                            'type': 'content',
+                            'session_id': session_id,
+                            'index': index
+                        }
+                        yield _sse(chunk_data)
+                        index += 1
+                        buffer.clear()
+                        buffered = 0
+                    
+                    if event["type"] == "done":
+                        # The turn is saved by now, so later history reads must not hit the cache
+                        _invalidate_history(session_id)
+                        # Only the final answer is replayed, not text streamed before tool calls
+                        if key:
+                            _recent_responses[key] = {
+                                "response": event.get("response"),
+                                "error": None,
+                                "session_id": session_id,
+                                "tokens_used": 0
+                            }
+                        # Send completion signal
+                        yield _sse({'type': 'done', 'session_id': session_id, 'tokens_used': event.get('tokens_used')})
             
-            # Stream the response word by word
-            words = response_text.split()
-            for i, word in enumerate(words):
-                chunk_data = {
-                    'content': word,
-                    'type': 'content',
-                    'session_id': session_id,
-                    'index': i
-                }
-                yield f"data: {json.dumps(chunk_data)}\n\n"
-                # Add small delay to simulate streaming
-                await asyncio.sleep(0.1)
-            
-            # Send completion signal
-            yield f"data: {json.dumps({'type': 'done', 'session_id': session_id})}\n\n"
+            finally:
+                _invalidate_history(session_id)
             
         except Exception as e:
             logger.error(f"Error in streaming chat: {str(e)}")
-            yield f"data: {json.dumps({'error': str(e), 'session_id': session_id, 'type': 'error'})}\n\n"
+            yield _sse({'error': str(e), 'session_id': session_id, 'type': 'error'})
     
     return StreamingResponse(
         event_stream(),
@@ -184,8 +285,6 @@ async def stream_chat(chat_request: ChatMessage):
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "*",
         }
     )
 
@@ -196,7 +295,13 @@ async def get_session_history(session_id: str):
     try:
         logger.info(f"Retrieving history for session: {session_id}")
         
-        history = get_chat_history(session_id)
+        history = _history_cache.get(session_id)
+        if history is None:
+            epoch = _history_epoch
+            history = await asyncio.to_thread(get_chat_history, session_id)
+            # A message handled meanwhile may have changed the history this read returned
+            if epoch == _history_epoch:
+                _history_cache[session_id] = history
         
         return HistoryResponse(
             session_id=session_id,
@@ -207,12 +312,15 @@ async def get_session_history(session_id: str):
         logger.error(f"Error retrieving chat history: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error retrieving history: {str(e)}")
 
-# Clear session (optional - creates new session)
+# Clear session (deletes its stored history and creates a new session)
 @app.delete("/api/sessions/{session_id}")
 async def clear_session(session_id: str):
-    """Clear a chat session (note: creates a new session ID)"""
+    """Clear a chat session's stored history and return a new session ID"""
     try:
-        new_session_id = str(uuid.uuid4())
+        await asyncio.to_thread(clear_chat_history, session_id)
+        _invalidate_history(session_id)
+        
+        new_session_id = create_session_id()
         logger.info(f"Cleared session {session_id}, new session: {new_session_id}")
         
         return SessionResponse(session_id=new_session_id)
@@ -221,35 +329,42 @@ async def clear_session(session_id: str):
         logger.error(f"Error clearing session: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error clearing session: {str(e)}")
 
-# List active sessions (basic endpoint)
+# List recently active sessions. The API has no authentication, so this exposes every
+# session id (and with it each conversation's history) to any client that can reach it
 @app.get("/api/sessions")
-async def list_sessions():
-    """List sessions - basic implementation"""
-    return {"message": "Session listing not implemented yet - sessions are managed per request"}
+async def list_sessions(limit: int = Query(100, ge=1, le=1000)):
+    """List the most recently active sessions, newest first"""
+    sessions = await asyncio.to_thread(list_chat_sessions, limit)
+    return {"sessions": sessions}
 
 # Root endpoint
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
-    return {
-        "message": "AI Business Advisor API with Streaming",
-        "version": "1.0.0",
-        "endpoints": {
-            "health": "/health",
-            "create_session": "POST /api/sessions",
-            "send_message": "POST /api/chat",
-            "stream_message": "POST /api/chat/stream",
-            "get_history": "GET /api/sessions/{session_id}/history",
-            "clear_session": "DELETE /api/sessions/{session_id}"
-        }
-    }
+    return Response(_ROOT_BYTES, media_type="application/json")
 
 if __name__ == "__main__":
-    # Run the FastAPI server
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
+    # Run the FastAPI server: auto-reload in development, one worker per CPU core (at most 4)
+    # otherwise. Workers read WEB_CONCURRENCY to split the database pools between them.
+    if os.getenv("ENVIRONMENT") == "development":
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=True,
+            log_level="info"
+        )
+    else:
+        workers = int(os.getenv("WEB_CONCURRENCY") or min(os.cpu_count() or 2, 4))
+        os.environ["WEB_CONCURRENCY"] = str(workers)
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=workers,
+            loop="uvloop",
+            http="httptools",
+            limit_concurrency=1000,
+            timeout_keep_alive=30,
+            log_level="info"
+        )
@@ -10,11 +10,14 @@ import time
 
 API_BASE_URL = "http://localhost:8000"
 
+# One keep-alive connection for every request in the run
+SESSION = requests.Session()
+
 def test_health_check():
     """Test the health check endpoint"""
     print("Testing health check...")
     try:
-        response = requests.get(f"{API_BASE_URL}/health")
+        response = SESSION.get(f"{API_BASE_URL}/health")
         if response.status_code == 200:
             print("✅ Health check passed")
             print(f"Response: {response.json()}")
@@ -27,7 +30,7 @@ def test_create_session():
     """Test creating a new session"""
     print("\nTesting session creation...")
     try:
-        response = requests.post(f"{API_BASE_URL}/api/sessions")
+        response = SESSION.post(f"{API_BASE_URL}/api/sessions")
         if response.status_code == 200:
             session_data = response.json()
             print("✅ Session created successfully")
@@ -48,7 +51,7 @@ def test_chat_message(session_id, message):
             "message": message,
             "session_id": session_id
         }
-        response = requests.post(
+        response = SESSION.post(
             f"{API_BASE_URL}/api/chat",
             json=payload,
             headers={"Content-Type": "application/json"}
@@ -73,7 +76,7 @@ def test_chat_history(session_id):
     """Test getting chat history"""
     print(f"\nTesting chat history for session {session_id}...")
     try:
-        response = requests.get(f"{API_BASE_URL}/api/sessions/{session_id}/history")
+        response = SESSION.get(f"{API_BASE_URL}/api/sessions/{session_id}/history")
         if response.status_code == 200:
             history_data = response.json()
             print("✅ Chat history retrieved successfully")